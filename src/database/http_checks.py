@@ -0,0 +1,213 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import json
+import tempfile
+import time
+import uuid
+from requests import Response
+from requests.adapters import BaseAdapter
+from src.main import create_app
+from src.database.init_db import create_schema, insert_test_data, init_database
+
+# Responses are compressed at any size here, so every check also covers gzip
+CHECK_CONFIG = {'COMPRESS_MIN_SIZE': 0, 'SESSION_COOKIE_SECURE': False}
+
+def _login(app, username, password):
+    client = app.test_client()
+    response = client.post('/api/auth/login', json={'username': username, 'password': password})
+    if response.status_code != 200:
+        raise RuntimeError(f'Cannot log in as {username}: {response.status_code}')
+    return client
+
+def _revalidates(client, url, **headers):
+    """Fetch url, send its ETag back and expect a 304"""
+    first = client.get(url, headers=headers)
+    etag = first.headers.get('ETag')
+    if first.status_code != 200 or not etag:
+        return f'{url}: expected 200 with an ETag, got {first.status_code}'
+    again = client.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+    if again.status_code != 304:
+        return f'{url}: sending back {etag} gave {again.status_code}, expected 304'
+    return None
+
+def check_gzip_revalidation(app):
+    """Compressed reference lists still answer their own ETag with a 304"""
+    client = _login(app, 'admin', 'admin123')
+    return [
+        error for error in (
+            _revalidates(client, url, **{'Accept-Encoding': encoding})
+            for url in ('/api/auth/departments', '/api/tickets/categories')
+            for encoding in ('gzip', 'identity')
+        )
+        if error
+    ]
+
+def _student(app, username):
+    client = app.test_client()
+    client.post('/api/auth/register', json={
+        'username': username, 'email': f'{username}@example.edu', 'password': 'pw123456',
+        'full_name': username, 'role': 'student'
+    })
+    return _login(app, username, 'pw123456')
+
+def _ticket(app, student):
+    """A ticket of `student` in the staff_it user's department"""
+    from src.models.user import User, TicketCategory
+    with app.app_context():
+        department_id = User.query.filter_by(username='staff_it').first().department_id
+        category_id = TicketCategory.query.first().id
+    response = student.post('/api/tickets/create', json={
+        'title': 'Projector not working', 'description': 'Room 101', 'category_id': category_id,
+        'department_id': department_id
+    })
+    return response.json['ticket']['id']
+
+def check_rating_invalidates_detail(app):
+    """A write that leaves updated_at alone still changes what revalidation answers"""
+    student = _student(app, 'check_rating')
+    staff = _login(app, 'staff_it', 'staff123')
+    ticket_id = _ticket(app, student)
+    staff.post(f'/api/tickets/{ticket_id}/status', json={'status': 'resolved'})
+
+    url = f'/api/tickets/{ticket_id}'
+    first = student.get(url)
+    etag, last_modified = first.headers.get('ETag'), first.headers.get('Last-Modified')
+    student.post(f'/api/tickets/{ticket_id}/rate', json={'rating': 5})
+
+    errors = []
+    for name, value in (('If-None-Match', etag), ('If-Modified-Since', last_modified)):
+        if value is None:
+            continue
+        response = student.get(url, headers={name: value})
+        if response.status_code != 200 or response.json['ticket']['satisfaction_rating'] != 5:
+            errors.append(f'{url} with {name} after rating gave {response.status_code}, expected the rated ticket')
+    return errors
+
+def check_staff_without_department(app):
+    """Staff with no department see no tickets, and no institution-wide stats either"""
+    from src.models.user import db, User
+    with app.app_context():
+        staff = User(username='check_no_dept', email='check_no_dept@example.edu', full_name='No Department', role='staff')
+        staff.set_password('pw123456')
+        db.session.add(staff)
+        db.session.commit()
+    client = _login(app, 'check_no_dept', 'pw123456')
+
+    errors = []
+    for url, key in (('/api/tickets/stats', 'stats'), ('/api/dashboard', 'stats')):
+        response = client.get(url)
+        total = response.json[key]['total'] if response.status_code == 200 else None
+        if total != 0:
+            errors.append(f'{url}: total {total} for staff without a department, expected 0')
+    return errors
+
+class FakeVonageAdapter(BaseAdapter):
+    """Stands in for the Vonage Messages API under the real SDK client
+
+    Answers each recipient with its scripted status codes in turn, then 202.
+    """
+
+    def __init__(self, replies):
+        super().__init__()
+        self.replies = {to: list(codes) for to, codes in replies.items()}
+        self.calls = []
+
+    def send(self, request, **kwargs):
+        to = json.loads(request.body)['to']
+        self.calls.append(to)
+        codes = self.replies.get(to)
+        status = codes.pop(0) if codes else 202
+        if status == 202:
+            body = {'message_uuid': str(uuid.uuid4())}
+        else:
+            body = {'type': 'https://developer.vonage.com/api-errors', 'title': f'Error {status}', 'detail': 'fake'}
+        response = Response()
+        response.status_code = status
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(body).encode()
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+def check_whatsapp_delivery(app, timeout=15):
+    """Messages go through the SDK to a fake API: 429 is retried, 422 fails, 202 is sent"""
+    from src.models.user import db, WhatsAppMessage
+    from src.utils.vonage_whatsapp import whatsapp_delivery, get_client
+    os.environ.update(VONAGE_API_KEY='check', VONAGE_API_SECRET='check', VONAGE_WHATSAPP_NUMBER='15550000000')
+    adapter = FakeVonageAdapter({'15550000001': [429], '15550000009': [422]})
+    get_client().http_client._session.mount('https://', adapter)
+
+    expected = {'15550000001': ('sent', 2), '15550000002': ('sent', 1), '15550000009': ('failed', 1)}
+    with app.app_context():
+        ids = {to: whatsapp_delivery.enqueue(to, 'Your ticket was updated') for to in expected}
+        db.session.commit()
+        ids = {to: message.id for to, message in ids.items()}
+
+    deadline = time.monotonic() + timeout
+    while True:
+        with app.app_context():
+            outcomes = {to: db.session.get(WhatsAppMessage, message_id) for to, message_id in ids.items()}
+            outcomes = {to: (message.status, message.attempts) for to, message in outcomes.items()}
+        if all(status != 'queued' for status, attempts in outcomes.values()) or time.monotonic() > deadline:
+            break
+        time.sleep(0.2)
+
+    errors = [
+        f'{to}: {outcomes[to]} after {adapter.calls.count(to)} API calls, expected {outcome}'
+        for to, outcome in expected.items() if outcomes[to] != outcome
+    ]
+
+    # Delivery status is for staff, and never shows the recipient's number
+    url = f"/api/whatsapp/messages/{ids['15550000002']}"
+    for name, client, status in (
+        ('anonymous', app.test_client(), 401),
+        ('student', _student(app, 'check_whatsapp'), 403),
+        ('staff', _login(app, 'staff_it', 'staff123'), 200),
+    ):
+        response = client.get(url)
+        if response.status_code != status:
+            errors.append(f'{url} as {name} gave {response.status_code}, expected {status}')
+        elif status == 200 and 'to' in response.json['message']:
+            errors.append(f'{url} exposes the recipient number')
+    return errors
+
+CHECKS = [
+    check_gzip_revalidation,
+    check_rating_invalidates_detail,
+    check_staff_without_department,
+    check_whatsapp_delivery,
+]
+
+def run_checks(app):
+    """Return {check name: [errors]} for the checks that failed"""
+    failures = {}
+    for check in CHECKS:
+        errors = check(app)
+        if errors:
+            failures[check.__name__] = errors
+    return failures
+
+if __name__ == '__main__':
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+    config = dict(CHECK_CONFIG, SQLALCHEMY_DATABASE_URI=f'sqlite:///{database.name}')
+    app = create_app(config)
+    try:
+        with app.app_context():
+            create_schema()
+            insert_test_data()
+            init_database()
+        failures = run_checks(app)
+    finally:
+        os.unlink(database.name)
+
+    for name, errors in failures.items():
+        for error in errors:
+            print(f"FAILED {name}: {error}")
+    print(f"{len(CHECKS) - len(failures)} HTTP checks ok, {len(failures)} failed")
+    sys.exit(1 if failures else 0)
@@ -3,6 +3,11 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.models.user import db, User, Department, TicketCategory, FAQ
+from src.utils.change_log import ensure_change_tracking
+from src.utils.ticket_counters import ensure_ticket_counters
+from src.utils.faq_search import ensure_faq_search_index
+from src.utils.ticket_search import ensure_ticket_search_index
+from src.utils.ticket_ids import ensure_ticket_ids
 from datetime import datetime
 import random
 import string
@@ -11,6 +16,51 @@ def generate_ticket_id():
     """Generate a unique ticket ID"""
     return 'TKT' + ''.join(random.choices(string.digits, k=6))
 
+# Indexes no query uses any more; dropped from databases that still have them
+RETIRED_INDEXES = [
+    # Stats GROUP BY covering indexes, replaced by the ticket_counters rollup
+    'ix_tickets_department_status_priority',
+    'ix_tickets_status_priority',
+]
+
+def create_indexes():
+    """Create model indexes missing from tables that predate them and drop retired ones"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    with db.engine.begin() as conn:
+        for name in RETIRED_INDEXES:
+            conn.execute(db.text(f'DROP INDEX IF EXISTS {name}'))
+
+def create_schema():
+    """Create missing tables, columns and indexes; safe to run on every deploy"""
+    db.create_all()
+    ensure_change_tracking()
+    ensure_ticket_ids()
+    create_indexes()
+    ensure_ticket_counters()
+    ensure_faq_search_index()
+    ensure_ticket_search_index()
+
+def insert_test_data():
+    """Add the default departments and categories that are missing"""
+    # Departments to add
+    departments = ["Computer Science", "Mathematics", "Physics", "Chemistry"]
+    existing = {name for (name,) in db.session.query(Department.name).filter(Department.name.in_(departments))}
+    for dept_name in departments:
+        if dept_name not in existing:
+            db.session.add(Department(name=dept_name, is_active=True))
+
+    # Categories to add
+    categories = ["Exam", "Fees", "Hostel", "Library"]
+    existing = {name for (name,) in db.session.query(TicketCategory.name).filter(TicketCategory.name.in_(categories))}
+    for cat_name in categories:
+        if cat_name not in existing:
+            db.session.add(TicketCategory(name=cat_name, is_active=True))
+
+    db.session.commit()
+    print("Test departments and categories added!")
+
 def init_database():
     """Initialize database with sample data"""
     
@@ -159,6 +209,7 @@ if __name__ == '__main__':
     db.init_app(app)
     
     with app.app_context():
-        db.create_all()
+        create_schema()
+        insert_test_data()
         init_database()
 
@@ -0,0 +1,111 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import argparse
+import gzip
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from flask import Flask
+from src.models.user import User, Department, TicketCategory, Ticket, TicketResponse, FAQ
+from src.utils.json_provider import FastJSONProvider, orjson
+from src.utils.compression import brotli, DEFAULT_LEVEL, DEFAULT_BROTLI_QUALITY
+
+WORDS = (
+    'exam hall ticket fee receipt hostel room library book semester result '
+    'transcript portal password login course credit schedule payment refund '
+    'the a my is not and for with please when was have been since today'
+).split()
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+def typical_payloads(seed=0):
+    """The bodies of my-tickets, the FAQ list and a long ticket thread, built from the models"""
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1)
+    department = Department(id=1, name='Examinations')
+    category = TicketCategory(id=1, name='Exam')
+    student = User(id=10, username='student', full_name='Priya Sharma', role='student')
+    staff = User(id=2, username='staff_exam', full_name='Rahul Verma', role='staff')
+
+    def ticket(number):
+        return Ticket(
+            id=number, ticket_id=f'TKT{number:06d}', title=_text(rng, 8), description=_text(rng, 60),
+            status=rng.choice(['open', 'in_progress', 'resolved']), priority=rng.choice(['low', 'medium', 'high']),
+            student_id=student.id, category_id=category.id, department_id=department.id,
+            created_at=now + timedelta(hours=number), updated_at=now + timedelta(hours=number + 1),
+            student=student, category=category, department=department
+        )
+
+    detail = ticket(1).to_dict()
+    detail['responses'] = [
+        TicketResponse(
+            id=number, ticket_id=1, user_id=staff.id, message=_text(rng, 50), is_internal=False,
+            created_at=now + timedelta(minutes=number), responder=staff
+        ).to_dict()
+        for number in range(1, 151)
+    ]
+    return {
+        'my-tickets (20)': {
+            'tickets': [ticket(number).to_dict() for number in range(1, 21)],
+            'pagination': {'page': 1, 'pages': 3, 'per_page': 20, 'total': 57, 'has_next': True, 'has_prev': False}
+        },
+        'faq list (60)': {
+            'faqs': [
+                FAQ(
+                    id=number, question=_text(rng, 10) + '?', answer=_text(rng, 140), category_id=category.id,
+                    category=category, is_active=True, view_count=rng.randint(0, 5000),
+                    created_at=now, updated_at=now
+                ).to_dict()
+                for number in range(1, 61)
+            ]
+        },
+        'ticket detail (150 responses)': {'ticket': detail}
+    }
+
+def _time(function, repeat):
+    """Median milliseconds per call, and the last result"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+def run_benchmark(repeat):
+    app = Flask(__name__)
+    provider = FastJSONProvider(app)
+    encoders = {'stdlib': lambda obj: json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')}
+    if orjson is not None:
+        encoders['orjson'] = provider._encode
+
+    rows = []
+    for name, payload in typical_payloads().items():
+        for encoder, encode in encoders.items():
+            encode_ms, body = _time(lambda: encode(payload), repeat)
+            gzip_ms, gzipped = _time(lambda: gzip.compress(body, DEFAULT_LEVEL, mtime=0), repeat)
+            row = {
+                'payload': name, 'encoder': encoder, 'encode_ms': encode_ms, 'bytes': len(body),
+                'gzip_bytes': len(gzipped), 'gzip_ms': gzip_ms
+            }
+            if brotli is not None:
+                row['br_ms'], compressed = _time(lambda: brotli.compress(body, quality=DEFAULT_BROTLI_QUALITY), repeat)
+                row['br_bytes'] = len(compressed)
+            rows.append(row)
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bytes on the wire and encode time for typical API payloads')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    for row in run_benchmark(args.repeat):
+        line = (f"{row['payload']:30} {row['encoder']:7} encode {row['encode_ms']:7.3f} ms  "
+                f"{row['bytes']:8} B  gzip {row['gzip_bytes']:7} B in {row['gzip_ms']:6.3f} ms")
+        if 'br_bytes' in row:
+            line += f"  br {row['br_bytes']:7} B in {row['br_ms']:6.3f} ms"
+        print(line)
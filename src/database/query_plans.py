@@ -0,0 +1,203 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import json
+import re
+from datetime import datetime
+from sqlalchemy import func, select, text, tuple_
+from src.models.user import db, User, Ticket, TicketResponse
+from src.utils.serialization import with_ticket_relations, with_response_relations
+from src.utils.ticket_stats import stats_query
+from src.utils.ticket_reads import unread_count
+from src.utils.ticket_search import TICKET_FTS, RESPONSE_FTS, ensure_ticket_search_index
+from src.utils.auth_cache import AuthInfo
+
+# Tables that grow with usage; a full scan on any of them is a regression
+LARGE_TABLES = {'tickets', 'ticket_responses', 'users', TICKET_FTS, RESPONSE_FTS}
+
+# Full scans that are accepted, with the reason; anything else is a regression
+ALLOWED_SCANS = {
+    # Walks ix_tickets_created_at newest first and stops at the LIMIT
+    'my_tickets_admin': {'tickets'},
+    # The admin page total counts every ticket; cursor mode and include_total=false skip it
+    'my_tickets_admin_count': {'tickets'},
+    # Only for group_by/bucket breakdowns; plain stats read the ticket_counters rollup
+    'stats_admin': {'tickets'},
+    # Walks ix_tickets_change_seq newest first and stops at the unread window
+    'unread_admin': {'tickets'},
+    # A department or the whole institution is too many tickets to probe one by one;
+    # every match is ranked and the scope filter applied after
+    'search_staff': {TICKET_FTS, RESPONSE_FTS},
+    'search_admin': {TICKET_FTS, RESPONSE_FTS},
+}
+
+SAMPLE_USER_ID = 1
+SAMPLE_DEPARTMENT_ID = 1
+SAMPLE_TICKET_ID = 1
+
+def _count(query):
+    """The COUNT(*) statement Flask-SQLAlchemy paginate() issues for a query"""
+    return select(func.count()).select_from(query.order_by(None).subquery())
+
+def _listing(query, status=None):
+    if status:
+        query = query.filter_by(status=status)
+    return with_ticket_relations(query).order_by(Ticket.created_at.desc()).limit(10).offset(0).statement
+
+def _listing_count(query, status=None):
+    if status:
+        query = query.filter_by(status=status)
+    return _count(query)
+
+def _cursor_listing(query, status=None):
+    if status:
+        query = query.filter_by(status=status)
+    query = with_ticket_relations(query).filter(
+        tuple_(Ticket.created_at, Ticket.id) < tuple_(datetime(2024, 1, 1), SAMPLE_TICKET_ID)
+    )
+    return query.order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(11).statement
+
+def _thread_page(public_only=False, older=False):
+    query = with_response_relations(TicketResponse.query).filter_by(ticket_id=SAMPLE_TICKET_ID)
+    if public_only:
+        query = query.filter(TicketResponse.is_internal == False)
+    if older:
+        query = query.filter(
+            tuple_(TicketResponse.created_at, TicketResponse.id) < tuple_(datetime(2024, 1, 1), 1)
+        )
+    return query.order_by(TicketResponse.created_at.desc(), TicketResponse.id.desc()).limit(21).statement
+
+def ticket_queries():
+    """Every query issued by src/routes/tickets.py and the dashboard, keyed by a readable name"""
+    student_scope = Ticket.query.filter_by(student_id=SAMPLE_USER_ID)
+    staff_scope = Ticket.query.filter_by(department_id=SAMPLE_DEPARTMENT_ID)
+    admin_scope = Ticket.query
+
+    queries = {
+        'current_user': User.query.filter_by(id=SAMPLE_USER_ID).statement,
+        'ticket_by_pk': Ticket.query.filter_by(id=SAMPLE_TICKET_ID).statement,
+        'ticket_detail': with_ticket_relations(Ticket.query).filter_by(id=SAMPLE_TICKET_ID).statement,
+        'ticket_version': db.session.query(
+            Ticket.student_id, Ticket.department_id, Ticket.change_seq
+        ).filter_by(id=SAMPLE_TICKET_ID).statement,
+        'ticket_responses_latest': _thread_page(),
+        'ticket_responses_latest_public': _thread_page(public_only=True),
+        'ticket_responses_older': _thread_page(older=True),
+        'ticket_responses_older_public': _thread_page(public_only=True, older=True),
+    }
+
+    for scope_name, scope in (('student', student_scope), ('staff', staff_scope), ('admin', admin_scope)):
+        queries[f'my_tickets_{scope_name}'] = _listing(scope)
+        queries[f'my_tickets_{scope_name}_count'] = _listing_count(scope)
+        queries[f'my_tickets_{scope_name}_status'] = _listing(scope, 'open')
+        queries[f'my_tickets_{scope_name}_status_count'] = _listing_count(scope, 'open')
+        queries[f'my_tickets_{scope_name}_cursor'] = _cursor_listing(scope)
+        queries[f'my_tickets_{scope_name}_status_cursor'] = _cursor_listing(scope, 'open')
+        queries[f'my_tickets_{scope_name}_version'] = scope.with_entities(
+            Ticket.change_seq
+        ).filter(Ticket.change_seq.isnot(None)).order_by(Ticket.change_seq.desc()).limit(1).statement
+        queries[f'unread_{scope_name}'] = unread_count(scope, SAMPLE_USER_ID).statement
+        queries[f'changes_{scope_name}'] = scope.filter(
+            Ticket.change_seq > 0, Ticket.change_seq <= 100
+        ).order_by(Ticket.change_seq, Ticket.id).limit(101).statement
+
+    for scope_name, scope in (('student', student_scope), ('staff', staff_scope)):
+        queries[f'changes_responses_{scope_name}'] = TicketResponse.query.filter(
+            TicketResponse.change_seq > 0,
+            TicketResponse.change_seq <= 100,
+            TicketResponse.ticket_id.in_(scope.with_entities(Ticket.id))
+        ).statement
+    queries['changes_responses_admin'] = TicketResponse.query.filter(
+        TicketResponse.change_seq > 0,
+        TicketResponse.change_seq <= 100
+    ).statement
+
+    queries['stats_staff'] = stats_query(SAMPLE_DEPARTMENT_ID).statement
+    queries['stats_admin'] = stats_query().statement
+
+    search = ensure_ticket_search_index()
+    if search is not None:
+        for role in ('student', 'staff', 'admin'):
+            auth = AuthInfo(SAMPLE_USER_ID, role, SAMPLE_DEPARTMENT_ID, True)
+            queries[f'search_{role}'] = search.search_statement(['printer'], auth, None, 20)
+
+    return queries
+
+def _compile(statement):
+    return str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+
+def _sqlite_full_scans(sql):
+    """Tables the SQLite planner reads in full, from the table or from a whole index
+
+    A full-text table counts when it is not looked up by rowid ('=' in its
+    index string), i.e. when every row matching the query is visited.
+    """
+    rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)).fetchall()
+    scans = []
+    for row in rows:
+        match = re.match(r'^SCAN (\w+)(?: VIRTUAL TABLE INDEX \d+:(\S*))?', row[-1])
+        if match and '=' not in (match.group(2) or ''):
+            scans.append(match.group(1))
+    return scans
+
+def _postgres_full_scans(sql):
+    """Tables Postgres still reads in full once seq scans are discouraged"""
+    db.session.execute(text('SET LOCAL enable_seqscan = off'))
+    plan = db.session.execute(text('EXPLAIN (FORMAT JSON) ' + sql)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        node_type = node.get('Node Type')
+        # An index scan without a condition reads the whole index
+        if node_type == 'Seq Scan' or (node_type in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node):
+            scans.append(node.get('Relation Name'))
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+def check_query_plans(queries=None):
+    """Return {query name: [tables]} for queries that fall back to a full scan not in ALLOWED_SCANS"""
+    queries = queries if queries is not None else ticket_queries()
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        full_scans = _sqlite_full_scans
+    elif dialect == 'postgresql':
+        full_scans = _postgres_full_scans
+    else:
+        raise RuntimeError(f'Unsupported database dialect: {dialect}')
+
+    failures = {}
+    try:
+        for name, statement in queries.items():
+            allowed = ALLOWED_SCANS.get(name, set())
+            tables = [t for t in full_scans(_compile(statement)) if t in LARGE_TABLES and t not in allowed]
+            if tables:
+                failures[name] = tables
+    finally:
+        db.session.rollback()
+    return failures
+
+if __name__ == '__main__':
+    from flask import Flask
+    from src.database.init_db import create_indexes
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = (
+        sys.argv[1] if len(sys.argv) > 1 else os.environ.get('DATABASE_URL', 'sqlite://')
+    )
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        create_indexes()
+        failures = check_query_plans()
+        for name, tables in failures.items():
+            print(f"FULL SCAN {name}: {', '.join(tables)}")
+        print(f"{len(ticket_queries()) - len(failures)} query plans ok, {len(failures)} full scans")
+        sys.exit(1 if failures else 0)
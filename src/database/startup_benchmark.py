@@ -0,0 +1,70 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import argparse
+import json
+import statistics
+import subprocess
+
+# Run in a fresh interpreter per sample, so every number is a cold start
+WORKER_START = r'''
+import json, sys, time
+start = time.perf_counter()
+import src.main
+imported = time.perf_counter()
+app = src.main.create_app()
+created = time.perf_counter()
+response = app.test_client().get('/')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import': (imported - start) * 1000,
+    'create_app': (created - imported) * 1000,
+    'first_request': (served - created) * 1000,
+    'total': (served - start) * 1000
+}))
+'''
+
+PHASES = ('import', 'create_app', 'first_request', 'total')
+
+def sample_worker_start(root, env):
+    result = subprocess.run(
+        [sys.executable, '-c', WORKER_START],
+        cwd=root, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def run_benchmark(runs, database_url):
+    """Cold-start timings in milliseconds per phase: {phase: {'median', 'p95', 'max'}}"""
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, DATABASE_URL=database_url)
+    samples = [sample_worker_start(root, env) for _ in range(runs)]
+    return {
+        phase: {
+            'median': statistics.median(sample[phase] for sample in samples),
+            'p95': percentile([sample[phase] for sample in samples], 0.95),
+            'max': max(sample[phase] for sample in samples)
+        }
+        for phase in PHASES
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure how long a new worker takes to become ready')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL', 'sqlite://'),
+                        help='Only configured, never queried during startup')
+    parser.add_argument('--max-ms', type=float, help='Fail when the median total exceeds this budget')
+    args = parser.parse_args()
+
+    timings = run_benchmark(args.runs, args.database_url)
+    for phase in PHASES:
+        print(f"{phase:14} median {timings[phase]['median']:8.1f} ms  "
+              f"p95 {timings[phase]['p95']:8.1f} ms  max {timings[phase]['max']:8.1f} ms")
+    if args.max_ms is not None and timings['total']['median'] > args.max_ms:
+        print(f"Median cold start {timings['total']['median']:.1f} ms exceeds {args.max_ms:.1f} ms")
+        sys.exit(1)
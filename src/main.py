@@ -3,84 +3,197 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+import click
+from flask import Flask, current_app
 from flask_cors import CORS
 from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.tickets import tickets_bp
 from src.routes.faq import faq_bp
-from src.routes.websocket import socketio
+from src.routes.dashboard import dashboard_bp
+from src.routes.websocket import socketio, dispatcher
 from src.routes.whatsapp import whatsapp_bp
+from src.utils.auth_cache import auth_cache
+from src.utils.socketio_queue import local_queue_manager
+from src.utils.presence import presence
+from src.utils.view_counter import view_counter
+from src.utils.outbox import outbox
+from src.utils.vonage_whatsapp import whatsapp_delivery
+from src.utils.attachment_store import attachment_store
+from src.utils.static_assets import static_assets, build_assets
+from src.utils.json_provider import FastJSONProvider
+from src.utils.compression import response_compressor
+from src.utils.ticket_counters import rebuild_ticket_counters, verify_ticket_counters
+from src.database.init_db import create_schema, insert_test_data, init_database
+
+def create_app(config=None):
+    """Build the app; nothing touches the database until the first request
+
+    Create the schema with `flask --app src.main init-db` and the default
+    data with `flask --app src.main seed`; gunicorn loads
+    'src.main:create_app()'.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    # orjson when installed, otherwise the stdlib encoder
+    app.json = FastJSONProvider(app)
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+
+    # Ticket IDs look like TKT000123; numbers are reserved in blocks per process
+    app.config['TICKET_ID_PREFIX'] = os.environ.get('TICKET_ID_PREFIX', 'TKT')
+    app.config['TICKET_ID_WIDTH'] = int(os.environ.get('TICKET_ID_WIDTH', 6))
+    app.config['TICKET_ID_BLOCK_SIZE'] = int(os.environ.get('TICKET_ID_BLOCK_SIZE', 20))
+
+    # FAQ views are buffered and written in bulk every interval or threshold views
+    app.config['FAQ_VIEW_FLUSH_INTERVAL'] = float(os.environ.get('FAQ_VIEW_FLUSH_INTERVAL', 5))
+    app.config['FAQ_VIEW_FLUSH_THRESHOLD'] = int(os.environ.get('FAQ_VIEW_FLUSH_THRESHOLD', 100))
+
+    # Notifications are written to the outbox with the change and sent by a background dispatcher
+    app.config['OUTBOX_BATCH_SIZE'] = int(os.environ.get('OUTBOX_BATCH_SIZE', 50))
+    app.config['OUTBOX_POLL_INTERVAL'] = float(os.environ.get('OUTBOX_POLL_INTERVAL', 1))
+    app.config['OUTBOX_MAX_ATTEMPTS'] = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+    # Sent notifications are deleted from the outbox after this many days
+    app.config['OUTBOX_RETENTION_DAYS'] = float(os.environ.get('OUTBOX_RETENTION_DAYS', 7))
+
+    # WhatsApp messages are sent by a worker pool per process; WHATSAPP_RATE is shared by
+    # all processes, the recipient interval is kept per process
+    app.config['WHATSAPP_WORKERS'] = int(os.environ.get('WHATSAPP_WORKERS', 4))
+    app.config['WHATSAPP_RATE'] = float(os.environ.get('WHATSAPP_RATE', 10))
+    app.config['WHATSAPP_RECIPIENT_INTERVAL'] = float(os.environ.get('WHATSAPP_RECIPIENT_INTERVAL', 1))
+    app.config['WHATSAPP_MAX_ATTEMPTS'] = int(os.environ.get('WHATSAPP_MAX_ATTEMPTS', 6))
+
+    # Attachments are stored once per distinct content (by SHA-256) under this folder
+    app.config['ATTACHMENT_FOLDER'] = os.environ.get('ATTACHMENT_FOLDER', os.path.join(os.path.dirname(__file__), 'database', 'attachments'))
+    app.config['MAX_ATTACHMENT_SIZE'] = int(os.environ.get('MAX_ATTACHMENT_SIZE', 16 * 1024 * 1024))
+    # Let a front server with X-Sendfile support (Apache, lighttpd) send attachment files
+    app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+
+    # Fingerprinted, precompressed static files from `flask --app src.main build-assets`;
+    # without a build, static/ is served as is
+    app.config['ASSET_BUILD_FOLDER'] = os.environ.get('ASSET_BUILD_FOLDER', os.path.join(os.path.dirname(__file__), 'static_build'))
+
+    # JSON responses over this many bytes are gzip (or brotli) compressed for clients that accept it
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+
+    # Set session cookie settings for cross-site authentication
+    app.config['SESSION_COOKIE_SAMESITE'] = 'None'
+    app.config['SESSION_COOKIE_SECURE'] = True
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    app.config.update(config or {})
+    if not app.config['SQLALCHEMY_DATABASE_URI']:
+        raise RuntimeError("DATABASE_URL environment variable not set!")
+
+    # Seconds a user's cached role/department/active flag is trusted by this process
+    auth_cache.ttl = int(os.environ.get('AUTH_CACHE_TTL', 60))
+
+    # Ticket updates within this many seconds are merged into one WebSocket message
+    dispatcher.window = float(os.environ.get('WEBSOCKET_COALESCE_WINDOW', 0.3))
+
+    # Enable CORS for all routes
+    CORS(app, supports_credentials=True)
+
+    # Initialize SocketIO. Workers share rooms through SOCKETIO_MESSAGE_QUEUE:
+    # redis://, kafka://, zmq+tcp:// or amqp:// brokers, or sqlite:///path.db
+    # for several workers on one host without a broker
+    message_queue = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    client_manager = local_queue_manager(message_queue)
+    if client_manager:
+        socketio.init_app(app, cors_allowed_origins="*", client_manager=client_manager)
+    else:
+        socketio.init_app(app, cors_allowed_origins="*", message_queue=message_queue)
+
+    # Online users are shared between workers through PRESENCE_URL (sqlite:///path.db). It
+    # defaults to a SQLite message queue's file; with a broker it is kept in the app database;
+    # without a queue it is per process
+    presence.configure(os.environ.get('PRESENCE_URL', message_queue), app.config['SQLALCHEMY_DATABASE_URI'])
+
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(tickets_bp, url_prefix='/api/tickets')
+    app.register_blueprint(faq_bp, url_prefix='/api/faq')
+    app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+    app.register_blueprint(whatsapp_bp, url_prefix='/api/whatsapp')
+
+    db.init_app(app)
+    view_counter.init_app(app)
+    outbox.init_app(app)
+    whatsapp_delivery.init_app(app)
+    attachment_store.init_app(app)
+    static_assets.init_app(app)
+    response_compressor.init_app(app)
+
+    register_commands(app)
+    app.add_url_rule('/', defaults={'path': ''}, view_func=serve)
+    app.add_url_rule('/<path:path>', view_func=serve)
+    return app
+
+def register_commands(app):
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create missing tables, columns and indexes"""
+        create_schema()
+        click.echo('Database schema is up to date')
+
+    @app.cli.command('seed')
+    @click.option('--sample-data', is_flag=True, help='Also add sample users, staff and FAQs')
+    def seed_command(sample_data):
+        """Add the default departments and categories"""
+        insert_test_data()
+        if sample_data:
+            init_database()
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprint and precompress static files for serving with long-lived caching"""
+        manifest = build_assets(app.static_folder, app.config['ASSET_BUILD_FOLDER'])
+        for path, entry in sorted(manifest['files'].items()):
+            if entry['immutable']:
+                click.echo(f"{path} ({', '.join(entry['encodings']) or 'uncompressed'})")
+        click.echo(f"Built {len(manifest['files'])} assets into {app.config['ASSET_BUILD_FOLDER']}")
+
+    @app.cli.command('rebuild-ticket-counters')
+    @click.option('--check-only', is_flag=True, help='Only compare the counters with the tickets table')
+    def rebuild_ticket_counters_command(check_only):
+        """Recompute the ticket_counters rollup and verify it against tickets"""
+        if not check_only:
+            rebuild_ticket_counters()
+        mismatches = verify_ticket_counters()
+        for mismatch in mismatches:
+            click.echo(f"Mismatch {mismatch}")
+        if mismatches:
+            raise SystemExit(1)
+        click.echo('Ticket counters match the tickets table')
+
+    @app.cli.command('outbox-status')
+    def outbox_status_command():
+        """Show the notification outbox backlog and delivery lag"""
+        metrics = outbox.metrics()
+        click.echo(f"Pending: {metrics['pending']}")
+        click.echo(f"Failed: {metrics['failed']}")
+        click.echo(f"Oldest pending event: {metrics['oldest_pending_age']:.1f}s old")
+
+    @app.cli.command('prune-outbox')
+    @click.option('--days', type=float, help='Keep sent events this many days (default OUTBOX_RETENTION_DAYS)')
+    def prune_outbox_command(days):
+        """Delete sent notifications past their retention period"""
+        click.echo(f"Deleted {outbox.prune(days)} sent events")
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# Set session cookie settings for cross-site authentication
-app.config['SESSION_COOKIE_SAMESITE'] = 'None'
-app.config['SESSION_COOKIE_SECURE'] = True
-
-# Enable CORS for all routes
-CORS(app, supports_credentials=True)
-
-# Initialize SocketIO
-socketio.init_app(app, cors_allowed_origins="*")
-
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(tickets_bp, url_prefix='/api/tickets')
-app.register_blueprint(faq_bp, url_prefix='/api/faq')
-app.register_blueprint(whatsapp_bp, url_prefix='/api/whatsapp')
-
-# uncomment if you need to use database
-db_url = os.environ.get("DATABASE_URL")
-if not db_url:
-    raise RuntimeError("DATABASE_URL environment variable not set!")
-app.config['SQLALCHEMY_DATABASE_URI'] = db_url
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-with app.app_context():
-    db.create_all()
-
-# Add this near the top of src/main.py
-def insert_test_data():
-    from src.models.user import db, Department, TicketCategory
-
-    # Departments to add
-    departments = ["Computer Science", "Mathematics", "Physics", "Chemistry"]
-    for dept_name in departments:
-        if not Department.query.filter_by(name=dept_name).first():
-            db.session.add(Department(name=dept_name, is_active=True))
-
-    # Categories to add
-    categories = ["Exam", "Fees", "Hostel", "Library"]
-    for cat_name in categories:
-        if not TicketCategory.query.filter_by(name=cat_name).first():
-            db.session.add(TicketCategory(name=cat_name, is_active=True))
-
-    db.session.commit()
-    print("Test departments and categories added!")
-
-# Call this inside your app context at startup
-with app.app_context():
-    insert_test_data()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+    if current_app.static_folder is None:
+        return "Static folder not configured", 404
+
+    # Unknown paths get index.html, for client-side routing
+    asset = static_assets.lookup(path) if path else None
+    if asset is None:
+        asset = static_assets.lookup('index.html')
+        if asset is None:
             return "index.html not found", 404
+    return static_assets.send(asset)
 
 
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=5001, debug=False)
+    socketio.run(create_app(), host='0.0.0.0', port=5001, debug=False)
@@ -6,6 +6,11 @@ db = SQLAlchemy()
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # admin user listing, optionally by role, in (created_at, id) keyset order
+        db.Index('ix_users_role_created', 'role', 'created_at', 'id'),
+        db.Index('ix_users_created_at', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -92,6 +97,20 @@ class TicketCategory(db.Model):
 
 class Ticket(db.Model):
     __tablename__ = 'tickets'
+    __table_args__ = (
+        # my-tickets listings: scope [+ status] in (created_at, id) order, newest first
+        db.Index('ix_tickets_student_status_created', 'student_id', 'status', 'created_at', 'id'),
+        db.Index('ix_tickets_student_created', 'student_id', 'created_at', 'id'),
+        db.Index('ix_tickets_department_status_created', 'department_id', 'status', 'created_at', 'id'),
+        db.Index('ix_tickets_department_created', 'department_id', 'created_at', 'id'),
+        db.Index('ix_tickets_status_created', 'status', 'created_at', 'id'),
+        db.Index('ix_tickets_created_at', 'created_at', 'id'),
+        db.Index('ix_tickets_assigned_to', 'assigned_to'),
+        # delta sync: scope in change_seq order
+        db.Index('ix_tickets_student_change_seq', 'student_id', 'change_seq'),
+        db.Index('ix_tickets_department_change_seq', 'department_id', 'change_seq'),
+        db.Index('ix_tickets_change_seq', 'change_seq'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     ticket_id = db.Column(db.String(20), unique=True, nullable=False)  # Generated ticket ID
@@ -114,6 +133,7 @@ class Ticket(db.Model):
     # Additional fields
     attachment_path = db.Column(db.String(255), nullable=True)
     satisfaction_rating = db.Column(db.Integer, nullable=True)  # 1-5 rating after resolution
+    change_seq = db.Column(db.BigInteger, nullable=True)  # Bumped on every change, for delta sync
     
     # Relationships
     responses = db.relationship('TicketResponse', backref='ticket', lazy='dynamic', cascade='all, delete-orphan')
@@ -141,8 +161,53 @@ class Ticket(db.Model):
             'assigned_staff_name': self.assigned_staff.full_name if self.assigned_staff else None
         }
 
+class IdCounter(db.Model):
+    """Named block counters for ID allocation on databases without sequences"""
+    __tablename__ = 'id_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False)
+
+class TicketCounter(db.Model):
+    """Rollup of ticket counts per (department, status, priority) for dashboard stats"""
+    __tablename__ = 'ticket_counters'
+    
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    priority = db.Column(db.String(20), primary_key=True)
+    ticket_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)  # Ratings of resolved tickets
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'department_id': self.department_id,
+            'status': self.status,
+            'priority': self.priority,
+            'ticket_count': self.ticket_count,
+            'rating_sum': self.rating_sum,
+            'rating_count': self.rating_count
+        }
+
+class TicketRead(db.Model):
+    """How far a user has read a ticket, as the ticket's change_seq at the time"""
+    __tablename__ = 'ticket_reads'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), primary_key=True)
+    last_read_seq = db.Column(db.BigInteger, nullable=False, default=0)
+    read_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class TicketResponse(db.Model):
     __tablename__ = 'ticket_responses'
+    __table_args__ = (
+        # ticket thread, oldest first
+        db.Index('ix_ticket_responses_ticket_created', 'ticket_id', 'created_at'),
+        # delta sync: new responses of changed tickets
+        db.Index('ix_ticket_responses_ticket_change_seq', 'ticket_id', 'change_seq'),
+        # delta sync: every response in a change_seq range
+        db.Index('ix_ticket_responses_change_seq', 'change_seq'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
@@ -151,6 +216,7 @@ class TicketResponse(db.Model):
     is_internal = db.Column(db.Boolean, default=False)  # Internal staff notes vs public responses
     attachment_path = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    change_seq = db.Column(db.BigInteger, nullable=True)  # Change sequence value when it was added
 
     def to_dict(self):
         return {
@@ -165,8 +231,47 @@ class TicketResponse(db.Model):
             'responder_role': self.responder.role if self.responder else None
         }
 
+class Attachment(db.Model):
+    """A file attached to a ticket or one of its responses
+
+    The bytes live once per distinct content in the attachment store,
+    keyed by sha256, so many rows may point at the same file.
+    """
+    __tablename__ = 'attachments'
+    __table_args__ = (
+        # a ticket's attachments, oldest first
+        db.Index('ix_attachments_ticket', 'ticket_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
+    response_id = db.Column(db.Integer, db.ForeignKey('ticket_responses.id'), nullable=True)
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'ticket_id': self.ticket_id,
+            'response_id': self.response_id,
+            'uploaded_by': self.uploaded_by,
+            'filename': self.filename,
+            'content_type': self.content_type,
+            'size': self.size,
+            'sha256': self.sha256,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 class FAQ(db.Model):
     __tablename__ = 'faqs'
+    __table_args__ = (
+        # cursor-mode FAQ listing of active entries
+        db.Index('ix_faqs_active_created', 'is_active', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     question = db.Column(db.Text, nullable=False)
@@ -193,3 +298,76 @@ class FAQ(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+
+class OutboxEvent(db.Model):
+    """Notification written in the same transaction as the change it announces"""
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        # dispatcher: due pending events, oldest first
+        db.Index('ix_outbox_events_status_next_attempt', 'status', 'next_attempt_at', 'id'),
+        # retention: sent events past their keep time
+        db.Index('ix_outbox_events_status_sent_at', 'status', 'sent_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+    channel = db.Column(db.String(20), nullable=False)  # socketio, whatsapp
+    event = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_by = db.Column(db.String(32), nullable=True)  # Claim token of the dispatcher delivering it
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'idempotency_key': self.idempotency_key,
+            'channel': self.channel,
+            'event': self.event,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+class WhatsAppMessage(db.Model):
+    """Outgoing WhatsApp message and its delivery status"""
+    __tablename__ = 'whatsapp_messages'
+    __table_args__ = (
+        # delivery workers: due queued messages, oldest first
+        db.Index('ix_whatsapp_messages_status_next_attempt', 'status', 'next_attempt_at', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+    to = db.Column(db.String(32), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_by = db.Column(db.String(32), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    provider_message_id = db.Column(db.String(64), nullable=True)  # Vonage message_uuid
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        # No recipient number: the send endpoint is public
+        return {
+            'id': self.id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'provider_message_id': self.provider_message_id,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
@@ -1,5 +1,8 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, g
 from src.models.user import db, User, Department
+from src.utils.auth_cache import auth_cache
+from src.utils.reference_cache import departments_cache
+from src.utils.pagination import wants_cursor, keyset_paginate, offset_page
 from functools import wraps
 
 auth_bp = Blueprint('auth', __name__)
@@ -13,6 +16,18 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def current_auth():
+    """Cached (id, role, department_id, is_active) of the logged-in user"""
+    if 'current_auth' not in g:
+        g.current_auth = auth_cache.get(session['user_id']) if 'user_id' in session else None
+    return g.current_auth
+
+def load_current_user():
+    """Load the logged-in User once per request"""
+    if 'current_user' not in g:
+        g.current_user = User.query.get(session['user_id']) if 'user_id' in session else None
+    return g.current_user
+
 def role_required(roles):
     """Decorator to require specific roles"""
     def decorator(f):
@@ -21,8 +36,8 @@ def role_required(roles):
             if 'user_id' not in session:
                 return jsonify({'error': 'Authentication required'}), 401
             
-            user = User.query.get(session['user_id'])
-            if not user or user.role not in roles:
+            auth = current_auth()
+            if not auth or not auth.is_active or auth.role not in roles:
                 return jsonify({'error': 'Insufficient permissions'}), 403
             return f(*args, **kwargs)
         return decorated_function
@@ -134,7 +149,7 @@ def logout():
 def get_current_user():
     """Get current user information"""
     try:
-        user = User.query.get(session['user_id'])
+        user = load_current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -153,7 +168,7 @@ def change_password():
         if not data.get('current_password') or not data.get('new_password'):
             return jsonify({'error': 'Current password and new password are required'}), 400
         
-        user = User.query.get(session['user_id'])
+        user = load_current_user()
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -173,10 +188,7 @@ def change_password():
 def get_departments():
     """Get all active departments"""
     try:
-        departments = Department.query.filter_by(is_active=True).all()
-        return jsonify({
-            'departments': [dept.to_dict() for dept in departments]
-        }), 200
+        return departments_cache.response()
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -194,6 +206,32 @@ def get_users():
         if role_filter:
             query = query.filter_by(role=role_filter)
         
+        if wants_cursor(request.args):
+            try:
+                result = keyset_paginate(
+                    query,
+                    User,
+                    cursor=request.args.get('cursor'),
+                    limit=request.args.get('limit', type=int)
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            return jsonify({
+                'users': [user.to_dict() for user in result['items']],
+                'next_cursor': result['next_cursor'],
+                'prev_cursor': result['prev_cursor'],
+                'has_more': result['has_more']
+            }), 200
+        
+        if request.args.get('include_total') == 'false':
+            items, has_more = offset_page(query.order_by(User.id), page, per_page)
+            return jsonify({
+                'users': [user.to_dict() for user in items],
+                'has_more': has_more,
+                'current_page': page
+            }), 200
+        
         users = query.paginate(
             page=page, 
             per_page=per_page, 
@@ -221,6 +259,7 @@ def toggle_user_status(user_id):
         
         user.is_active = not user.is_active
         db.session.commit()
+        auth_cache.invalidate(user.id)
         
         return jsonify({
             'message': f'User {"activated" if user.is_active else "deactivated"} successfully',
@@ -0,0 +1,44 @@
+from flask import Blueprint, jsonify, request
+from src.models.user import Ticket
+from src.routes.auth import login_required, current_auth, load_current_user
+from src.routes.tickets import visible_tickets
+from src.utils.ticket_stats import aggregate_ticket_stats, stats_scope
+from src.utils.ticket_reads import unread_count
+from src.utils.change_log import current_change_seq, encode_change_token
+from src.utils.serialization import with_ticket_relations, serialize_tickets
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+@dashboard_bp.route('', methods=['GET'])
+@login_required
+def get_dashboard():
+    """Everything the dashboard shows, in one response"""
+    try:
+        auth = current_auth()
+        limit = max(1, min(request.args.get('limit', 5, type=int), 20))
+        
+        # Taken first, so a later /tickets/changes call misses nothing
+        sync_token = encode_change_token(current_change_seq())
+        
+        stats = None
+        if auth.role in ['staff', 'admin']:
+            stats = aggregate_ticket_stats(stats_scope(auth))
+        
+        recent_tickets = (
+            with_ticket_relations(visible_tickets(auth))
+            .order_by(Ticket.created_at.desc(), Ticket.id.desc())
+            .limit(limit)
+            .all()
+        )
+        unread_tickets = unread_count(visible_tickets(auth), auth.id).scalar()
+        
+        return jsonify({
+            'user': load_current_user().to_dict(),
+            'stats': stats,
+            'recent_tickets': serialize_tickets(recent_tickets),
+            'unread': {'tickets': unread_tickets},
+            'sync_token': sync_token
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
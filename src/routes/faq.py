@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, FAQ, TicketCategory
 from src.routes.auth import login_required, role_required
+from src.utils.serialization import with_faq_relations, serialize_faqs
+from src.utils.pagination import wants_cursor, keyset_paginate
+from src.utils.faq_search import search_faqs as search_faq_index
+from src.utils.view_counter import view_counter
 
 faq_bp = Blueprint('faq', __name__)
 
@@ -11,21 +15,39 @@ def get_faqs():
         category_id = request.args.get('category_id', type=int)
         search_query = request.args.get('search', '')
         
-        query = FAQ.query.filter_by(is_active=True)
+        if search_query:
+            faqs = search_faq_index(search_query, category_id=category_id, limit=None)
+            return jsonify({
+                'faqs': serialize_faqs(faqs)
+            }), 200
+        
+        query = with_faq_relations(FAQ.query).filter_by(is_active=True)
         
         if category_id:
             query = query.filter_by(category_id=category_id)
         
-        if search_query:
-            query = query.filter(
-                FAQ.question.contains(search_query) | 
-                FAQ.answer.contains(search_query)
-            )
+        if wants_cursor(request.args):
+            try:
+                result = keyset_paginate(
+                    query,
+                    FAQ,
+                    cursor=request.args.get('cursor'),
+                    limit=request.args.get('limit', type=int)
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            return jsonify({
+                'faqs': serialize_faqs(result['items']),
+                'next_cursor': result['next_cursor'],
+                'prev_cursor': result['prev_cursor'],
+                'has_more': result['has_more']
+            }), 200
         
         faqs = query.order_by(FAQ.view_count.desc()).all()
         
         return jsonify({
-            'faqs': [faq.to_dict() for faq in faqs]
+            'faqs': serialize_faqs(faqs)
         }), 200
         
     except Exception as e:
@@ -33,20 +55,21 @@ def get_faqs():
 
 @faq_bp.route('/<int:faq_id>', methods=['GET'])
 def get_faq(faq_id):
-    """Get specific FAQ and increment view count"""
+    """Get specific FAQ and count the view"""
     try:
-        faq = FAQ.query.get(faq_id)
+        faq = with_faq_relations(FAQ.query).filter_by(id=faq_id).first()
         if not faq or not faq.is_active:
             return jsonify({'error': 'FAQ not found'}), 404
         
-        # Increment view count
-        faq.view_count += 1
-        db.session.commit()
+        # Buffer the view; counts are written in bulk by view_counter
+        pending = view_counter.increment(faq.id)
+        
+        faq_data = faq.to_dict()
+        faq_data['view_count'] = (faq.view_count or 0) + pending
         
-        return jsonify({'faq': faq.to_dict()}), 200
+        return jsonify({'faq': faq_data}), 200
         
     except Exception as e:
-        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @faq_bp.route('/create', methods=['POST'])
@@ -166,14 +189,11 @@ def search_faqs():
         if not query:
             return jsonify({'faqs': []}), 200
         
-        # Search in questions and answers
-        faqs = FAQ.query.filter(
-            FAQ.is_active == True,
-            (FAQ.question.contains(query) | FAQ.answer.contains(query))
-        ).order_by(FAQ.view_count.desc()).limit(10).all()
+        # Ranked full-text search in questions and answers
+        faqs = search_faq_index(query, limit=10)
         
         return jsonify({
-            'faqs': [faq.to_dict() for faq in faqs],
+            'faqs': serialize_faqs(faqs),
             'query': query
         }), 200
         
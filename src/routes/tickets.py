@@ -1,20 +1,72 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User, Ticket, TicketCategory, Department, TicketResponse
-from src.routes.auth import login_required, role_required
+from flask import Blueprint, request, jsonify, session, current_app, send_file
+from src.models.user import db, User, Ticket, TicketCategory, Department, TicketResponse, TicketRead, Attachment
+from src.routes.auth import login_required, role_required, current_auth
+from src.utils.reference_cache import categories_cache
+from src.utils.ticket_search import search_tickets as search_ticket_index
+from src.utils.suggestions import suggestion_engine
+from src.utils.ticket_stats import aggregate_ticket_stats, stats_scope
+from src.utils.ticket_ids import next_ticket_id
+from src.utils.ticket_counters import lock_ticket, counter_key, apply_counter_change
+from src.utils.change_log import current_change_seq, last_scope_removal, encode_change_token, decode_change_token
+from src.utils.ticket_reads import mark_ticket_read
+from src.utils.pagination import wants_cursor, keyset_paginate, offset_page
+from src.utils.serialization import with_ticket_relations, with_response_relations, serialize_tickets, serialize_responses
+from src.utils.attachment_store import attachment_store, AttachmentTooLarge
+from src.utils.conditional import version_etag, set_validators, not_modified
 from datetime import datetime
-import random
-import string
+from sqlalchemy import func
+import mimetypes
 import os
 from werkzeug.utils import secure_filename
 
 tickets_bp = Blueprint('tickets', __name__)
 
+# Responses sent with a ticket; older ones are fetched a page at a time
+THREAD_PAGE_SIZE = 20
+
 def generate_ticket_id():
     """Generate a unique ticket ID"""
-    while True:
-        ticket_id = 'TKT' + ''.join(random.choices(string.digits, k=6))
-        if not Ticket.query.filter_by(ticket_id=ticket_id).first():
-            return ticket_id
+    return next_ticket_id()
+
+def visible_tickets(user):
+    """Tickets the user may see: their own, their department's, or all for admins"""
+    if user.role == 'student':
+        return Ticket.query.filter_by(student_id=user.id)
+    if user.role == 'staff':
+        return Ticket.query.filter_by(department_id=user.department_id)
+    return Ticket.query
+
+def listing_version(user):
+    """Cheap version of the user's ticket scope: it changes whenever any visible ticket does
+
+    Every ticket change takes a new, higher change_seq, so the scope's
+    newest one, a single seek on its change_seq index, moves on each
+    change. Tickets leaving a scope (deleted, or moved to another
+    department or student) do not show there, so their commits also
+    bump a shared removal counter that is part of every listing's version.
+    """
+    latest = (
+        visible_tickets(user)
+        .with_entities(Ticket.change_seq)
+        .filter(Ticket.change_seq.isnot(None))
+        .order_by(None)
+        .order_by(Ticket.change_seq.desc())
+        .first()
+    )
+    max_seq = latest.change_seq if latest else None
+    scope = {'student': user.id, 'staff': user.department_id}.get(user.role)
+    etag = version_etag(
+        'tickets', user.role, scope, max_seq, last_scope_removal(), sorted(request.args.items(multi=True))
+    )
+    return etag
+
+def response_thread(ticket_id, user, cursor=None, limit=None):
+    """Latest page of the responses the user may see, oldest first, and a cursor for older ones"""
+    query = with_response_relations(TicketResponse.query).filter_by(ticket_id=ticket_id)
+    if user.role == 'student':
+        query = query.filter(TicketResponse.is_internal == False)
+    page = keyset_paginate(query, TicketResponse, cursor=cursor, limit=limit or THREAD_PAGE_SIZE)
+    return list(reversed(page['items'])), page['next_cursor']
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -26,10 +78,7 @@ def allowed_file(filename):
 def get_categories():
     """Get all active ticket categories"""
     try:
-        categories = TicketCategory.query.filter_by(is_active=True).all()
-        return jsonify({
-            'categories': [cat.to_dict() for cat in categories]
-        }), 200
+        return categories_cache.response()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -39,7 +88,7 @@ def create_ticket():
     """Create a new ticket (students only)"""
     try:
         # Check if user is a student
-        user = User.query.get(session['user_id'])
+        user = current_auth()
         if user.role != 'student':
             return jsonify({'error': 'Only students can create tickets'}), 403
         
@@ -72,15 +121,18 @@ def create_ticket():
         )
         
         db.session.add(ticket)
-        db.session.commit()
+        db.session.flush()
+        apply_counter_change(None, counter_key(ticket))
         
-        # Send real-time notification
+        # Queue the real-time notification in the same transaction
         try:
             from src.routes.websocket import notify_new_ticket
             notify_new_ticket(ticket)
         except ImportError:
             pass  # WebSocket not available
         
+        db.session.commit()
+        
         return jsonify({
             'message': 'Ticket created successfully',
             'ticket': ticket.to_dict()
@@ -95,43 +147,235 @@ def create_ticket():
 def get_my_tickets():
     """Get tickets for current user"""
     try:
-        user = User.query.get(session['user_id'])
+        user = current_auth()
+        etag = listing_version(user)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         status_filter = request.args.get('status')
         
-        if user.role == 'student':
-            query = Ticket.query.filter_by(student_id=user.id)
-        elif user.role == 'staff':
-            query = Ticket.query.filter_by(department_id=user.department_id)
-        else:  # admin
-            query = Ticket.query
+        query = visible_tickets(user)
         
         if status_filter:
             query = query.filter_by(status=status_filter)
         
-        tickets = query.order_by(Ticket.created_at.desc()).paginate(
+        if wants_cursor(request.args):
+            try:
+                result = keyset_paginate(
+                    with_ticket_relations(query),
+                    Ticket,
+                    cursor=request.args.get('cursor'),
+                    limit=request.args.get('limit', type=int)
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            return set_validators(jsonify({
+                'tickets': serialize_tickets(result['items']),
+                'next_cursor': result['next_cursor'],
+                'prev_cursor': result['prev_cursor'],
+                'has_more': result['has_more']
+            }), etag), 200
+        
+        query = with_ticket_relations(query).order_by(Ticket.created_at.desc())
+        
+        if request.args.get('include_total') == 'false':
+            items, has_more = offset_page(query, page, per_page)
+            return set_validators(jsonify({
+                'tickets': serialize_tickets(items),
+                'has_more': has_more,
+                'current_page': page
+            }), etag), 200
+        
+        tickets = query.paginate(
             page=page, 
             per_page=per_page, 
             error_out=False
         )
         
-        return jsonify({
-            'tickets': [ticket.to_dict() for ticket in tickets.items],
+        return set_validators(jsonify({
+            'tickets': serialize_tickets(tickets.items),
             'total': tickets.total,
             'pages': tickets.pages,
             'current_page': page
+        }), etag), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tickets_bp.route('/changes', methods=['GET'])
+@login_required
+def get_ticket_changes():
+    """Tickets and responses changed since a sync token
+    
+    Without `since` only the current token is returned; clients take it
+    after a full load and pass it back to get just what changed since.
+    """
+    try:
+        user = current_auth()
+        # Read the head first: anything committed after it is left for the next call
+        head = current_change_seq()
+        since = request.args.get('since')
+        if not since:
+            return jsonify({'tickets': [], 'responses': [], 'token': encode_change_token(head), 'has_more': False}), 200
+        
+        try:
+            since_seq = decode_change_token(since)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+        
+        query = with_ticket_relations(visible_tickets(user)).filter(
+            Ticket.change_seq > since_seq, Ticket.change_seq <= head
+        )
+        tickets = query.order_by(Ticket.change_seq, Ticket.id).limit(limit + 1).all()
+        has_more = len(tickets) > limit
+        tickets = tickets[:limit]
+        if has_more:
+            # Never split one change across pages
+            last = tickets[-1]
+            tickets += query.filter(Ticket.change_seq == last.change_seq, Ticket.id > last.id).order_by(Ticket.id).all()
+        token_seq = tickets[-1].change_seq if has_more else head
+        
+        # By their own change_seq, not by the tickets on this page: a reply whose ticket
+        # changed again later belongs to this range even though its ticket comes on a later page
+        response_query = with_response_relations(TicketResponse.query).filter(
+            TicketResponse.change_seq > since_seq,
+            TicketResponse.change_seq <= token_seq
+        )
+        if user.role != 'admin':
+            response_query = response_query.filter(
+                TicketResponse.ticket_id.in_(visible_tickets(user).with_entities(Ticket.id))
+            )
+        if user.role == 'student':
+            response_query = response_query.filter(TicketResponse.is_internal == False)
+        responses = response_query.order_by(TicketResponse.change_seq, TicketResponse.id).all()
+        
+        return jsonify({
+            'tickets': serialize_tickets(tickets),
+            'responses': serialize_responses(responses),
+            'token': encode_change_token(token_seq),
+            'has_more': has_more
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tickets_bp.route('/search', methods=['GET'])
+@login_required
+def search_tickets():
+    """Full-text search over tickets and their responses"""
+    try:
+        user = current_auth()
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'tickets': [], 'query': query}), 200
+        
+        tickets = search_ticket_index(
+            query,
+            user,
+            status=request.args.get('status'),
+            limit=request.args.get('limit', type=int)
+        )
+        
+        return jsonify({
+            'tickets': serialize_tickets(tickets),
+            'query': query
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@tickets_bp.route('/suggest', methods=['GET'])
+@login_required
+def suggest_similar():
+    """Suggest FAQs and open tickets similar to a ticket being written"""
+    try:
+        user = current_auth()
+        text = ' '.join(filter(None, [
+            request.args.get('q', ''),
+            request.args.get('title', ''),
+            request.args.get('description', '')
+        ]))
+        k = max(1, min(request.args.get('k', 5, type=int), 20))
+        
+        # Same scope as visible_tickets: staff only ever see their own department
+        department_id = request.args.get('department_id', type=int)
+        if user.role == 'staff':
+            department_id = user.department_id
+        
+        suggestions = suggestion_engine.suggest(
+            text,
+            department_id=department_id,
+            student_id=user.id if user.role == 'student' else None,
+            k=k
+        )
+        
+        return jsonify(suggestions), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @tickets_bp.route('/<int:ticket_id>', methods=['GET'])
 @login_required
 def get_ticket(ticket_id):
-    """Get ticket details with responses"""
+    """Get ticket details with its latest responses"""
     try:
-        user = User.query.get(session['user_id'])
+        user = current_auth()
+        # Just the version columns first: an unchanged ticket is answered with a 304
+        version = db.session.query(
+            Ticket.student_id, Ticket.department_id, Ticket.change_seq
+        ).filter_by(id=ticket_id).first()
+        
+        if not version:
+            return jsonify({'error': 'Ticket not found'}), 404
+        
+        # Check permissions
+        if user.role == 'student' and version.student_id != user.id:
+            return jsonify({'error': 'Access denied'}), 403
+        elif user.role == 'staff' and version.department_id != user.department_id:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        # Students see a different thread, without internal notes. A client holding
+        # this version was marked as having read it when it fetched it, so a 304 writes nothing
+        etag = version_etag(
+            'ticket', ticket_id, version.change_seq, user.role == 'student', request.args.get('responses_limit')
+        )
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        
+        # Viewing the ticket clears it from the user's unread count
+        read = db.session.get(TicketRead, (user.id, ticket_id))
+        if version.change_seq and (read is None or read.last_read_seq < version.change_seq):
+            mark_ticket_read(db.session.connection(), user.id, ticket_id, version.change_seq)
+            db.session.commit()
+        
+        ticket = with_ticket_relations(Ticket.query).filter_by(id=ticket_id).first()
+        
+        # Latest responses only; internal notes are filtered out for students
+        responses, older_cursor = response_thread(
+            ticket.id, user, limit=request.args.get('responses_limit', type=int)
+        )
+        
+        ticket_data = ticket.to_dict()
+        ticket_data['responses'] = serialize_responses(responses)
+        ticket_data['older_responses_cursor'] = older_cursor
+        
+        return set_validators(jsonify({'ticket': ticket_data}), etag), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tickets_bp.route('/<int:ticket_id>/responses', methods=['GET'])
+@login_required
+def get_ticket_responses(ticket_id):
+    """Page of a ticket's responses older than ?cursor=, oldest first"""
+    try:
+        user = current_auth()
         ticket = Ticket.query.get(ticket_id)
         
         if not ticket:
@@ -143,17 +387,19 @@ def get_ticket(ticket_id):
         elif user.role == 'staff' and ticket.department_id != user.department_id:
             return jsonify({'error': 'Access denied'}), 403
         
-        # Get responses
-        responses = TicketResponse.query.filter_by(ticket_id=ticket.id).order_by(TicketResponse.created_at.asc()).all()
-        
-        # Filter internal responses for students
-        if user.role == 'student':
-            responses = [r for r in responses if not r.is_internal]
-        
-        ticket_data = ticket.to_dict()
-        ticket_data['responses'] = [response.to_dict() for response in responses]
+        try:
+            responses, older_cursor = response_thread(
+                ticket.id, user,
+                cursor=request.args.get('cursor'),
+                limit=request.args.get('limit', type=int)
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify({'ticket': ticket_data}), 200
+        return jsonify({
+            'responses': serialize_responses(responses),
+            'older_cursor': older_cursor
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -163,7 +409,7 @@ def get_ticket(ticket_id):
 def respond_to_ticket(ticket_id):
     """Add response to ticket"""
     try:
-        user = User.query.get(session['user_id'])
+        user = current_auth()
         ticket = Ticket.query.get(ticket_id)
         
         if not ticket:
@@ -192,16 +438,17 @@ def respond_to_ticket(ticket_id):
         
         # Update ticket timestamp
         ticket.updated_at = datetime.utcnow()
+        db.session.flush()
         
-        db.session.commit()
-        
-        # Send real-time notification
+        # Queue the real-time notification in the same transaction
         try:
             from src.routes.websocket import notify_new_response
             notify_new_response(ticket, response)
         except ImportError:
             pass  # WebSocket not available
         
+        db.session.commit()
+        
         return jsonify({
             'message': 'Response added successfully',
             'response': response.to_dict()
@@ -211,6 +458,135 @@ def respond_to_ticket(ticket_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def visible_attachments(user):
+    """Attachments the user may download: on visible tickets, minus internal notes for students"""
+    query = Attachment.query.join(Ticket, Ticket.id == Attachment.ticket_id)
+    if user.role == 'student':
+        query = query.filter(Ticket.student_id == user.id).outerjoin(
+            TicketResponse, TicketResponse.id == Attachment.response_id
+        ).filter(db.or_(TicketResponse.is_internal.is_(None), TicketResponse.is_internal == False))
+    elif user.role == 'staff':
+        query = query.filter(Ticket.department_id == user.department_id)
+    return query
+
+@tickets_bp.route('/<int:ticket_id>/attachments', methods=['POST'])
+@login_required
+def upload_attachment(ticket_id):
+    """Stream an attachment into storage
+
+    The request body is either the raw file (name in ?filename=) or a
+    multipart form with a 'file' field. Pass ?response_id= to attach it
+    to one of your responses instead of the ticket.
+    """
+    try:
+        user = current_auth()
+        ticket = Ticket.query.get(ticket_id)
+        
+        if not ticket:
+            return jsonify({'error': 'Ticket not found'}), 404
+        
+        # Check permissions
+        if user.role == 'student' and ticket.student_id != user.id:
+            return jsonify({'error': 'Access denied'}), 403
+        elif user.role == 'staff' and ticket.department_id != user.department_id:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        response = None
+        response_id = request.args.get('response_id', type=int)
+        if response_id:
+            response = TicketResponse.query.filter_by(id=response_id, ticket_id=ticket.id, user_id=user.id).first()
+            if not response:
+                return jsonify({'error': 'Response not found'}), 404
+        
+        max_size = current_app.config['MAX_ATTACHMENT_SIZE']
+        if request.content_length and request.content_length > max_size:
+            return jsonify({'error': f'Attachment exceeds {max_size} bytes'}), 413
+        
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if not upload:
+                return jsonify({'error': 'File is required'}), 400
+            filename, stream = upload.filename, upload.stream
+        else:
+            filename, stream = request.args.get('filename'), request.stream
+        
+        filename = secure_filename(filename or '')
+        if not filename or not allowed_file(filename):
+            return jsonify({'error': 'File type not allowed'}), 400
+        
+        try:
+            sha256, size = attachment_store.save(stream, max_size)
+        except AttachmentTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        if not size:
+            return jsonify({'error': 'File is empty'}), 400
+        
+        attachment = Attachment(
+            ticket_id=ticket.id,
+            response_id=response.id if response else None,
+            uploaded_by=user.id,
+            filename=filename,
+            content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            size=size,
+            sha256=sha256
+        )
+        db.session.add(attachment)
+        (response or ticket).attachment_path = attachment_store.relative_path(sha256)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Attachment uploaded successfully',
+            'attachment': attachment.to_dict()
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@tickets_bp.route('/<int:ticket_id>/attachments', methods=['GET'])
+@login_required
+def get_ticket_attachments(ticket_id):
+    """List a ticket's attachments"""
+    try:
+        attachments = (
+            visible_attachments(current_auth())
+            .filter(Attachment.ticket_id == ticket_id)
+            .order_by(Attachment.id.asc())
+            .all()
+        )
+        return jsonify({'attachments': [attachment.to_dict() for attachment in attachments]}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tickets_bp.route('/attachments/<int:attachment_id>', methods=['GET'])
+@login_required
+def download_attachment(attachment_id):
+    """Download an attachment, with Range and conditional request support"""
+    try:
+        attachment = visible_attachments(current_auth()).filter(Attachment.id == attachment_id).first()
+        if not attachment:
+            return jsonify({'error': 'Attachment not found'}), 404
+        
+        # send_file streams through wsgi.file_wrapper (sendfile under gunicorn),
+        # or hands the file to the front server when USE_X_SENDFILE is set
+        response = send_file(
+            attachment_store.path(attachment.sha256),
+            mimetype=attachment.content_type,
+            as_attachment=True,
+            download_name=attachment.filename,
+            conditional=True,
+            etag=attachment.sha256,
+            max_age=3600
+        )
+        # The content behind an ETag never changes, but only this user may cache it
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @tickets_bp.route('/<int:ticket_id>/assign', methods=['POST'])
 @role_required(['staff', 'admin'])
 def assign_ticket(ticket_id):
@@ -239,15 +615,16 @@ def assign_ticket(ticket_id):
             ticket.assigned_to = None
         
         ticket.updated_at = datetime.utcnow()
-        db.session.commit()
         
-        # Send real-time notification
+        # Queue the real-time notification in the same transaction
         try:
             from src.routes.websocket import notify_ticket_assignment
             notify_ticket_assignment(ticket, assigned_staff)
         except ImportError:
             pass  # WebSocket not available
         
+        db.session.commit()
+        
         return jsonify({
             'message': 'Ticket assignment updated successfully',
             'ticket': ticket.to_dict()
@@ -262,7 +639,7 @@ def assign_ticket(ticket_id):
 def update_ticket_status(ticket_id):
     """Update ticket status"""
     try:
-        ticket = Ticket.query.get(ticket_id)
+        ticket = lock_ticket(ticket_id)
         if not ticket:
             return jsonify({'error': 'Ticket not found'}), 404
         
@@ -273,21 +650,24 @@ def update_ticket_status(ticket_id):
             return jsonify({'error': 'Invalid status'}), 400
         
         old_status = ticket.status
+        before = counter_key(ticket)
         ticket.status = new_status
         ticket.updated_at = datetime.utcnow()
         
         if new_status == 'resolved':
             ticket.resolved_at = datetime.utcnow()
         
-        db.session.commit()
+        apply_counter_change(before, counter_key(ticket))
         
-        # Send real-time notification
+        # Queue the real-time notification in the same transaction
         try:
             from src.routes.websocket import notify_ticket_update
             notify_ticket_update(ticket, 'status', f'Ticket status changed from {old_status} to {new_status}')
         except ImportError:
             pass  # WebSocket not available
         
+        db.session.commit()
+        
         return jsonify({
             'message': 'Ticket status updated successfully',
             'ticket': ticket.to_dict()
@@ -302,7 +682,7 @@ def update_ticket_status(ticket_id):
 def update_ticket_priority(ticket_id):
     """Update ticket priority"""
     try:
-        ticket = Ticket.query.get(ticket_id)
+        ticket = lock_ticket(ticket_id)
         if not ticket:
             return jsonify({'error': 'Ticket not found'}), 404
         
@@ -313,17 +693,20 @@ def update_ticket_priority(ticket_id):
             return jsonify({'error': 'Invalid priority'}), 400
         
         old_priority = ticket.priority
+        before = counter_key(ticket)
         ticket.priority = new_priority
         ticket.updated_at = datetime.utcnow()
-        db.session.commit()
+        apply_counter_change(before, counter_key(ticket))
         
-        # Send real-time notification
+        # Queue the real-time notification in the same transaction
         try:
             from src.routes.websocket import notify_ticket_update
             notify_ticket_update(ticket, 'priority', f'Ticket priority changed from {old_priority} to {new_priority}')
         except ImportError:
             pass  # WebSocket not available
         
+        db.session.commit()
+        
         return jsonify({
             'message': 'Ticket priority updated successfully',
             'ticket': ticket.to_dict()
@@ -338,11 +721,11 @@ def update_ticket_priority(ticket_id):
 def rate_ticket(ticket_id):
     """Rate resolved ticket (students only)"""
     try:
-        user = User.query.get(session['user_id'])
+        user = current_auth()
         if user.role != 'student':
             return jsonify({'error': 'Only students can rate tickets'}), 403
         
-        ticket = Ticket.query.get(ticket_id)
+        ticket = lock_ticket(ticket_id)
         if not ticket:
             return jsonify({'error': 'Ticket not found'}), 404
         
@@ -358,7 +741,9 @@ def rate_ticket(ticket_id):
         if not rating or rating not in [1, 2, 3, 4, 5]:
             return jsonify({'error': 'Rating must be between 1 and 5'}), 400
         
+        before = counter_key(ticket)
         ticket.satisfaction_rating = rating
+        apply_counter_change(before, counter_key(ticket))
         db.session.commit()
         
         return jsonify({
@@ -375,42 +760,15 @@ def rate_ticket(ticket_id):
 def get_ticket_stats():
     """Get ticket statistics"""
     try:
-        user = User.query.get(session['user_id'])
+        user = current_auth()
+        group_by = request.args.get('group_by', '')
+        dimensions = [name for name in group_by.split(',') if name]
+        bucket = request.args.get('bucket')
         
-        # Base query
-        if user.role == 'staff':
-            base_query = Ticket.query.filter_by(department_id=user.department_id)
-        else:  # admin
-            base_query = Ticket.query
-        
-        # Get counts by status
-        stats = {
-            'total': base_query.count(),
-            'open': base_query.filter_by(status='open').count(),
-            'in_progress': base_query.filter_by(status='in_progress').count(),
-            'resolved': base_query.filter_by(status='resolved').count(),
-            'closed': base_query.filter_by(status='closed').count()
-        }
-        
-        # Get counts by priority
-        stats['priority'] = {
-            'low': base_query.filter_by(priority='low').count(),
-            'medium': base_query.filter_by(priority='medium').count(),
-            'high': base_query.filter_by(priority='high').count(),
-            'urgent': base_query.filter_by(priority='urgent').count()
-        }
-        
-        # Get average satisfaction rating
-        resolved_tickets = base_query.filter(
-            Ticket.status == 'resolved',
-            Ticket.satisfaction_rating.isnot(None)
-        ).all()
-        
-        if resolved_tickets:
-            avg_rating = sum(t.satisfaction_rating for t in resolved_tickets) / len(resolved_tickets)
-            stats['average_rating'] = round(avg_rating, 2)
-        else:
-            stats['average_rating'] = None
+        try:
+            stats = aggregate_ticket_stats(stats_scope(user), dimensions, bucket)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({'stats': stats}), 200
         
@@ -1,12 +1,86 @@
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from flask import session
+from flask import request, session
 from src.models.user import User
-import json
+from src.routes.auth import current_auth
+from src.utils.presence import presence
+from src.utils.outbox import outbox
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
 
 socketio = SocketIO(cors_allowed_origins="*")
 
-# Store user sessions
-user_sessions = {}
+# ticket_update events for the same ticket that arrive within this many
+# seconds of each other reach each client as a single message
+COALESCE_WINDOW = 0.3
+
+class NotificationDispatcher:
+    """Fans each notification out once to the union of its target rooms
+
+    Callers serialize the payload once per event. Socket.IO encodes the
+    packet once and sends it to every session in any of the rooms exactly
+    once, so a client in both dept_ and ticket_ rooms gets one copy.
+    Coalesced events are held for `window` seconds and merged per key;
+    their outbox deliveries are finished once the merged event is sent.
+    """
+
+    def __init__(self, socketio, window=COALESCE_WINDOW):
+        self.socketio = socketio
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = {}  # coalesce key -> event waiting to be sent
+
+    def emit(self, event, payload, rooms):
+        self.socketio.emit(event, payload, to=sorted(set(rooms)))
+
+    def emit_coalesced(self, key, event, payload, rooms, update, delivery=None):
+        """Queue `update` under `key`; the latest payload wins, all updates are kept and rooms are merged"""
+        deliveries = [delivery.defer()] if delivery is not None else []
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending['payload'] = payload
+                pending['updates'].append(update)
+                pending['rooms'] = pending['rooms'] + [room for room in rooms if room not in pending['rooms']]
+                pending['deliveries'] += deliveries
+                return
+            self._pending[key] = {
+                'event': event, 'payload': payload, 'rooms': rooms, 'updates': [update], 'deliveries': deliveries
+            }
+
+        if self.window > 0:
+            self.socketio.start_background_task(self._flush_later, key)
+        else:
+            self.flush(key)
+
+    def _flush_later(self, key):
+        self.socketio.sleep(self.window)
+        self.flush(key)
+
+    def flush(self, key):
+        with self._lock:
+            pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        updates = pending['updates']
+        payload = dict(
+            pending['payload'],
+            update_type=updates[-1]['update_type'],
+            message='; '.join(update['message'] for update in updates),
+            updates=updates
+        )
+        try:
+            self.emit(pending['event'], payload, pending['rooms'])
+        except Exception as e:
+            logger.exception('Coalesced notification failed')
+            for delivery in pending['deliveries']:
+                delivery.failed(e)
+            return
+        for delivery in pending['deliveries']:
+            delivery.done()
+
+dispatcher = NotificationDispatcher(socketio)
 
 @socketio.on('connect')
 def handle_connect():
@@ -20,12 +94,8 @@ def handle_connect():
     if not user:
         return False
     
-    # Store user session
-    user_sessions[user_id] = {
-        'sid': session.get('sid'),
-        'role': user.role,
-        'department_id': user.department_id
-    }
+    # One sid per tab; display fields are cached for online-user lists
+    presence.connect(request.sid, user)
     
     # Join user to their personal room
     join_room(f'user_{user_id}')
@@ -44,21 +114,10 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
-    if 'user_id' in session:
-        user_id = session['user_id']
-        if user_id in user_sessions:
-            user = User.query.get(user_id)
-            if user:
-                # Leave all rooms
-                leave_room(f'user_{user_id}')
-                if user.role == 'staff' and user.department_id:
-                    leave_room(f'dept_{user.department_id}')
-                if user.role == 'admin':
-                    leave_room('admin')
-                
-                print(f"User {user.username} disconnected")
-            
-            del user_sessions[user_id]
+    # Socket.IO drops the sid from all its rooms itself
+    user = presence.disconnect(request.sid)
+    if user:
+        print(f"User {user['username']} disconnected")
 
 @socketio.on('join_ticket_room')
 def handle_join_ticket_room(data):
@@ -69,6 +128,10 @@ def handle_join_ticket_room(data):
     ticket_id = data.get('ticket_id')
     if ticket_id:
         join_room(f'ticket_{ticket_id}')
+        # Internal notes go to a staff-only room, so no per-server filtering is needed
+        auth = current_auth()
+        if auth and auth.role in ('staff', 'admin'):
+            join_room(f'ticket_{ticket_id}_staff')
         emit('joined_ticket_room', {'ticket_id': ticket_id})
 
 @socketio.on('leave_ticket_room')
@@ -80,112 +143,94 @@ def handle_leave_ticket_room(data):
     ticket_id = data.get('ticket_id')
     if ticket_id:
         leave_room(f'ticket_{ticket_id}')
+        leave_room(f'ticket_{ticket_id}_staff')
         emit('left_ticket_room', {'ticket_id': ticket_id})
 
+def deliver_notification(event, data, key, delivery):
+    """Outbox handler: emit a queued notification to its rooms
+
+    A coalesced one stays leased in the outbox until the merged event goes out.
+    """
+    payload = dict(data['payload'], event_id=key)
+    if data.get('coalesce'):
+        dispatcher.emit_coalesced(tuple(data['coalesce']), event, payload, data['rooms'], data['update'], delivery)
+    else:
+        dispatcher.emit(event, payload, data['rooms'])
+
+outbox.register('socketio', deliver_notification)
+
+# The notify_* functions queue the notification in the caller's transaction;
+# it is sent once the transaction commits, keyed by the ticket change it announces
+
 def notify_new_ticket(ticket):
     """Notify relevant users about new ticket"""
-    # Notify department staff
-    socketio.emit('new_ticket', {
-        'ticket': ticket.to_dict(),
-        'message': f'New ticket created: {ticket.title}'
-    }, room=f'dept_{ticket.department_id}')
-    
-    # Notify admin
-    socketio.emit('new_ticket', {
-        'ticket': ticket.to_dict(),
-        'message': f'New ticket created: {ticket.title}'
-    }, room='admin')
+    outbox.enqueue('socketio', 'new_ticket', {
+        'payload': {
+            'ticket': ticket.to_dict(),
+            'message': f'New ticket created: {ticket.title}'
+        },
+        'rooms': [f'dept_{ticket.department_id}', 'admin']
+    }, ticket=ticket)
 
 def notify_ticket_update(ticket, update_type, message):
-    """Notify relevant users about ticket updates"""
-    # Notify the student who created the ticket
-    socketio.emit('ticket_update', {
-        'ticket': ticket.to_dict(),
-        'update_type': update_type,
-        'message': message
-    }, room=f'user_{ticket.student_id}')
-    
-    # Notify department staff
-    socketio.emit('ticket_update', {
-        'ticket': ticket.to_dict(),
-        'update_type': update_type,
-        'message': message
-    }, room=f'dept_{ticket.department_id}')
-    
-    # Notify admin
-    socketio.emit('ticket_update', {
-        'ticket': ticket.to_dict(),
-        'update_type': update_type,
-        'message': message
-    }, room='admin')
-    
-    # Notify users in the specific ticket room
-    socketio.emit('ticket_update', {
-        'ticket': ticket.to_dict(),
-        'update_type': update_type,
-        'message': message
-    }, room=f'ticket_{ticket.id}')
+    """Notify relevant users about ticket updates, coalescing bursts per ticket"""
+    outbox.enqueue('socketio', 'ticket_update', {
+        'payload': {'ticket': ticket.to_dict()},
+        'rooms': [f'user_{ticket.student_id}', f'dept_{ticket.department_id}', 'admin', f'ticket_{ticket.id}'],
+        'coalesce': ['ticket_update', ticket.id],
+        'update': {'update_type': update_type, 'message': message}
+    }, ticket=ticket)
 
 def notify_new_response(ticket, response):
     """Notify relevant users about new response"""
-    # Notify the student who created the ticket (if response is not internal)
-    if not response.is_internal:
-        socketio.emit('new_response', {
+    if response.is_internal:
+        # Internal notes never reach the student, even through the ticket room
+        rooms = [f'dept_{ticket.department_id}', 'admin', f'ticket_{ticket.id}_staff']
+    else:
+        rooms = [f'user_{ticket.student_id}', f'dept_{ticket.department_id}', 'admin', f'ticket_{ticket.id}']
+    
+    outbox.enqueue('socketio', 'new_response', {
+        'payload': {
             'ticket': ticket.to_dict(),
             'response': response.to_dict(),
             'message': f'New response on ticket {ticket.ticket_id}'
-        }, room=f'user_{ticket.student_id}')
-    
-    # Notify department staff
-    socketio.emit('new_response', {
-        'ticket': ticket.to_dict(),
-        'response': response.to_dict(),
-        'message': f'New response on ticket {ticket.ticket_id}'
-    }, room=f'dept_{ticket.department_id}')
-    
-    # Notify admin
-    socketio.emit('new_response', {
-        'ticket': ticket.to_dict(),
-        'response': response.to_dict(),
-        'message': f'New response on ticket {ticket.ticket_id}'
-    }, room='admin')
-    
-    # Notify users in the specific ticket room
-    socketio.emit('new_response', {
-        'ticket': ticket.to_dict(),
-        'response': response.to_dict(),
-        'message': f'New response on ticket {ticket.ticket_id}'
-    }, room=f'ticket_{ticket.id}')
+        },
+        'rooms': rooms
+    }, ticket=ticket)
 
 def notify_ticket_assignment(ticket, assigned_staff):
     """Notify about ticket assignment"""
     if assigned_staff:
+        ticket_data = ticket.to_dict()
+        
         # Notify the assigned staff member
-        socketio.emit('ticket_assigned', {
-            'ticket': ticket.to_dict(),
-            'message': f'Ticket {ticket.ticket_id} has been assigned to you'
-        }, room=f'user_{assigned_staff.id}')
+        outbox.enqueue('socketio', 'ticket_assigned', {
+            'payload': {
+                'ticket': ticket_data,
+                'message': f'Ticket {ticket.ticket_id} has been assigned to you'
+            },
+            'rooms': [f'user_{assigned_staff.id}']
+        }, ticket=ticket)
         
-        # Notify the student
-        socketio.emit('ticket_update', {
-            'ticket': ticket.to_dict(),
-            'update_type': 'assignment',
-            'message': f'Your ticket has been assigned to {assigned_staff.full_name}'
-        }, room=f'user_{ticket.student_id}')
+        # Notify the student; shares the ticket's coalesce key so an assignment
+        # and a status change arrive as one ticket_update
+        outbox.enqueue('socketio', 'ticket_update', {
+            'payload': {'ticket': ticket_data},
+            'rooms': [f'user_{ticket.student_id}'],
+            'coalesce': ['ticket_update', ticket.id],
+            'update': {'update_type': 'assignment', 'message': f'Ticket has been assigned to {assigned_staff.full_name}'}
+        }, ticket=ticket)
 
 def get_online_users():
     """Get list of currently online users"""
-    online_users = []
-    for user_id, session_data in user_sessions.items():
-        user = User.query.get(user_id)
-        if user:
-            online_users.append({
-                'id': user.id,
-                'username': user.username,
-                'full_name': user.full_name,
-                'role': user.role
-            })
-    return online_users
+    return [
+        {'id': user['id'], 'username': user['username'], 'full_name': user['full_name'], 'role': user['role']}
+        for user in presence.online_users()
+    ]
+
+def get_online_counts():
+    """Online user totals per role and per department"""
+    return presence.counts()
 
 @socketio.on('get_online_users')
 def handle_get_online_users():
@@ -194,7 +239,15 @@ def handle_get_online_users():
         return
     
     online_users = get_online_users()
-    emit('online_users', {'users': online_users})
+    emit('online_users', {'users': online_users, 'counts': get_online_counts()})
+
+@socketio.on('get_online_counts')
+def handle_get_online_counts():
+    """Send online user counts to requesting client"""
+    if 'user_id' not in session:
+        return
+    
+    emit('online_counts', get_online_counts())
 
 # Periodic tasks (if needed)
 def send_periodic_updates():
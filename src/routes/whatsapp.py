@@ -1,17 +1,38 @@
-from flask import Blueprint, request, jsonify
-from utils.vonage_whatsapp import send_whatsapp_message
+from flask import Blueprint, request, jsonify, url_for
+from src.models.user import db, WhatsAppMessage
+from src.utils.vonage_whatsapp import whatsapp_delivery
+from src.routes.auth import role_required
 
 whatsapp_bp = Blueprint('whatsapp', __name__)
 
 @whatsapp_bp.route('/send_whatsapp', methods=['POST'])
 def send_whatsapp():
+    """Queue a WhatsApp message; staff can poll status_url for the delivery outcome"""
     data = request.json
     to = data.get('to')
     body = data.get('body')
     if not to or not body:
         return jsonify({'error': 'Missing "to" or "body"'}), 400
     try:
-        response = send_whatsapp_message(to, body)
-        return jsonify({'status': 'sent', 'response': response})
+        message = whatsapp_delivery.enqueue(to, body, key=data.get('idempotency_key'))
+        db.session.commit()
+        return jsonify({
+            'status': message.status,
+            'message': message.to_dict(),
+            'status_url': url_for('whatsapp.get_whatsapp_status', message_id=message.id)
+        }), 202
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@whatsapp_bp.route('/messages/<int:message_id>', methods=['GET'])
+@role_required(['staff', 'admin'])
+def get_whatsapp_status(message_id):
+    """Delivery status of a queued WhatsApp message"""
+    try:
+        message = WhatsAppMessage.query.get(message_id)
+        if not message:
+            return jsonify({'error': 'Message not found'}), 404
+        return jsonify({'message': message.to_dict()}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,7 +1,9 @@
 // Global variables
 let currentUser = null;
 let currentSection = 'dashboard';
-let currentPage = 1;
+let ticketsCursor = '';
+let changesToken = '';
+let olderResponsesCursor = null;
 let tickets = [];
 let categories = [];
 let departments = [];
@@ -79,6 +81,10 @@ function setupEventListeners() {
     // FAQ search
     document.getElementById('faqSearch').addEventListener('input', debounce(searchFAQs, 300));
 
+    // Similar FAQs / tickets while writing a ticket
+    document.getElementById('ticketTitle').addEventListener('input', debounce(loadTicketSuggestions, 300));
+    document.getElementById('ticketDescription').addEventListener('input', debounce(loadTicketSuggestions, 300));
+
     // Status filter
     document.getElementById('statusFilter').addEventListener('change', filterTickets);
 }
@@ -308,26 +314,18 @@ async function loadDashboard() {
     try {
         showLoading(true);
         
-        // Load stats for staff/admin
-        if (currentUser.role !== 'student') {
-            const statsResponse = await fetch(`${API_BASE}/tickets/stats`, {
-                credentials: 'include'
-            });
-            
-            if (statsResponse.ok) {
-                const statsData = await statsResponse.json();
-                renderStats(statsData.stats);
-            }
-        }
-
-        // Load recent tickets
-        const ticketsResponse = await fetch(`${API_BASE}/tickets/my-tickets?per_page=5`, {
+        // User, stats, recent tickets and unread count in one request
+        const response = await fetch(`${API_BASE}/dashboard`, {
             credentials: 'include'
         });
 
-        if (ticketsResponse.ok) {
-            const ticketsData = await ticketsResponse.json();
-            renderRecentTickets(ticketsData.tickets);
+        if (response.ok) {
+            const data = await response.json();
+            if (data.stats) {
+                renderStats(data.stats);
+            }
+            renderRecentTickets(data.recent_tickets);
+            renderUnreadBadge(data.unread.tickets);
         }
 
     } catch (error) {
@@ -338,6 +336,12 @@ async function loadDashboard() {
     }
 }
 
+function renderUnreadBadge(count) {
+    const badge = document.getElementById('unreadTicketsBadge');
+    badge.textContent = count > 99 ? '99+' : count;
+    badge.style.display = count > 0 ? 'inline-block' : 'none';
+}
+
 function renderStats(stats) {
     const statsGrid = document.getElementById('statsGrid');
     
@@ -410,7 +414,11 @@ async function loadTickets() {
     try {
         showLoading(true);
         const status = document.getElementById('statusFilter').value;
-        const url = `${API_BASE}/tickets/my-tickets?page=${currentPage}&per_page=10${status ? `&status=${status}` : ''}`;
+        const url = `${API_BASE}/tickets/my-tickets?limit=10&cursor=${encodeURIComponent(ticketsCursor)}${status ? `&status=${status}` : ''}`;
+        
+        // Take the sync token before the list, so later changes are never missed
+        changesToken = '';
+        await syncTicketChanges();
         
         const response = await fetch(url, {
             credentials: 'include'
@@ -420,7 +428,7 @@ async function loadTickets() {
             const data = await response.json();
             tickets = data.tickets;
             renderTickets(data.tickets);
-            renderPagination(data.current_page, data.pages, data.total);
+            renderPagination(data.prev_cursor, data.next_cursor);
         } else {
             showToast('Failed to load tickets', 'error');
         }
@@ -462,8 +470,59 @@ function renderTickets(tickets) {
     `).join('');
 }
 
+// Fetch only the tickets changed since the last sync and patch them into the list
+async function syncTicketChanges() {
+    try {
+        const since = changesToken ? `?since=${encodeURIComponent(changesToken)}` : '';
+        const response = await fetch(`${API_BASE}/tickets/changes${since}`, {
+            credentials: 'include'
+        });
+
+        if (!response.ok) {
+            changesToken = '';
+            return;
+        }
+
+        const data = await response.json();
+        const hadToken = changesToken !== '';
+        changesToken = data.token;
+
+        if (hadToken && data.tickets.length > 0) {
+            applyTicketChanges(data.tickets);
+        }
+        if (data.has_more) {
+            await syncTicketChanges();
+        }
+    } catch (error) {
+        console.error('Ticket sync error:', error);
+    }
+}
+
+function applyTicketChanges(changedTickets) {
+    if (currentSection !== 'tickets') return;
+
+    const status = document.getElementById('statusFilter').value;
+    changedTickets.forEach(ticket => {
+        const index = tickets.findIndex(t => t.id === ticket.id);
+        const matches = !status || ticket.status === status;
+
+        if (index >= 0) {
+            if (matches) {
+                tickets[index] = ticket;
+            } else {
+                tickets.splice(index, 1);
+            }
+        } else if (matches && ticketsCursor === '' && (!tickets.length || ticket.created_at > tickets[0].created_at)) {
+            // A new ticket belongs at the top of the first page
+            tickets.unshift(ticket);
+        }
+    });
+
+    renderTickets(tickets);
+}
+
 function filterTickets() {
-    currentPage = 1;
+    ticketsCursor = '';
     loadTickets();
 }
 
@@ -504,6 +563,69 @@ async function loadCreateTicketForm() {
     }
 }
 
+async function loadTicketSuggestions() {
+    const title = document.getElementById('ticketTitle').value;
+    const description = document.getElementById('ticketDescription').value;
+    const departmentId = document.getElementById('ticketDepartment').value;
+    const container = document.getElementById('ticketSuggestions');
+
+    if ((title + description).trim().length < 4) {
+        container.style.display = 'none';
+        return;
+    }
+
+    try {
+        const params = new URLSearchParams({ title, description, k: 3 });
+        if (departmentId) {
+            params.append('department_id', departmentId);
+        }
+        const response = await fetch(`${API_BASE}/tickets/suggest?${params}`, {
+            credentials: 'include'
+        });
+
+        if (response.ok) {
+            renderTicketSuggestions(await response.json());
+        }
+    } catch (error) {
+        console.error('Suggestion error:', error);
+    }
+}
+
+function renderTicketSuggestions(suggestions) {
+    const container = document.getElementById('ticketSuggestions');
+    // Titles are user-written: set as text, never as HTML
+    const suggestionItem = (icon, text, onClick) => {
+        const item = document.createElement('li');
+        item.innerHTML = `<i class="fas ${icon}"></i> `;
+        item.appendChild(document.createTextNode(text));
+        item.addEventListener('click', onClick);
+        return item;
+    };
+    const items = [
+        ...suggestions.faqs.map(faq =>
+            suggestionItem('fa-question-circle', faq.question, () => showSection('faq'))
+        ),
+        ...suggestions.tickets.map(ticket =>
+            suggestionItem(
+                'fa-ticket-alt',
+                `${ticket.ticket_id}: ${ticket.title} (${ticket.status.replace('_', ' ')})`,
+                () => openTicketModal(ticket.id)
+            )
+        )
+    ];
+
+    if (items.length === 0) {
+        container.style.display = 'none';
+        return;
+    }
+
+    const list = document.createElement('ul');
+    items.forEach(item => list.appendChild(item));
+    container.innerHTML = '<p>These may already answer your question:</p>';
+    container.appendChild(list);
+    container.style.display = 'block';
+}
+
 async function handleCreateTicket(e) {
     e.preventDefault();
     
@@ -531,6 +653,7 @@ async function handleCreateTicket(e) {
         if (response.ok) {
             showToast(`Ticket created successfully! ID: ${data.ticket.ticket_id}`, 'success');
             document.getElementById('createTicketForm').reset();
+            document.getElementById('ticketSuggestions').style.display = 'none';
             showSection('tickets');
         } else {
             showToast(data.error || 'Failed to create ticket', 'error');
@@ -679,6 +802,45 @@ async function openTicketModal(ticketId) {
     }
 }
 
+function renderResponseItem(response) {
+    return `
+        <div class="response-item">
+            <div class="response-header">
+                <span class="response-author">${response.responder_name} (${response.responder_role})</span>
+                <span>${formatDate(response.created_at)}</span>
+            </div>
+            <div class="response-message">${response.message}</div>
+        </div>
+    `;
+}
+
+async function loadOlderResponses(ticketId) {
+    if (!olderResponsesCursor) return;
+
+    const button = document.getElementById('loadOlderResponses');
+    button.disabled = true;
+    try {
+        const response = await fetch(`${API_BASE}/tickets/${ticketId}/responses?cursor=${encodeURIComponent(olderResponsesCursor)}`, {
+            credentials: 'include'
+        });
+
+        if (response.ok) {
+            const data = await response.json();
+            document.getElementById('responseList')
+                .insertAdjacentHTML('afterbegin', data.responses.map(renderResponseItem).join(''));
+            olderResponsesCursor = data.older_cursor;
+            button.style.display = olderResponsesCursor ? 'inline-flex' : 'none';
+        } else {
+            showToast('Failed to load older responses', 'error');
+        }
+    } catch (error) {
+        console.error('Older responses error:', error);
+        showToast('Failed to load older responses', 'error');
+    } finally {
+        button.disabled = false;
+    }
+}
+
 function renderTicketModal(ticket) {
     document.getElementById('modalTicketTitle').textContent = ticket.title;
     
@@ -698,20 +860,17 @@ function renderTicketModal(ticket) {
         </div>
     `;
 
-    // Render responses
+    // Render the latest responses; older ones load on demand
     const responsesContainer = document.getElementById('ticketResponses');
+    olderResponsesCursor = ticket.older_responses_cursor;
     if (ticket.responses && ticket.responses.length > 0) {
         responsesContainer.innerHTML = `
             <h4 style="margin-bottom: 15px;">Responses</h4>
-            ${ticket.responses.map(response => `
-                <div class="response-item">
-                    <div class="response-header">
-                        <span class="response-author">${response.responder_name} (${response.responder_role})</span>
-                        <span>${formatDate(response.created_at)}</span>
-                    </div>
-                    <div class="response-message">${response.message}</div>
-                </div>
-            `).join('')}
+            <button id="loadOlderResponses" class="btn btn-secondary btn-sm load-older-btn" onclick="loadOlderResponses(${ticket.id})"
+                style="display: ${olderResponsesCursor ? 'inline-flex' : 'none'};">
+                <i class="fas fa-history"></i> Load older responses
+            </button>
+            <div id="responseList">${ticket.responses.map(renderResponseItem).join('')}</div>
         `;
     } else {
         responsesContainer.innerHTML = '<p>No responses yet.</p>';
@@ -918,10 +1077,10 @@ async function loadDepartments() {
     }
 }
 
-function renderPagination(currentPage, totalPages, totalItems) {
+function renderPagination(prevCursor, nextCursor) {
     const container = document.getElementById('ticketsPagination');
     
-    if (totalPages <= 1) {
+    if (!prevCursor && !nextCursor) {
         container.innerHTML = '';
         return;
     }
@@ -929,22 +1088,17 @@ function renderPagination(currentPage, totalPages, totalItems) {
     let pagination = '<div class="pagination">';
     
     // Previous button
-    pagination += `<button ${currentPage === 1 ? 'disabled' : ''} onclick="changePage(${currentPage - 1})">Previous</button>`;
-    
-    // Page numbers
-    for (let i = Math.max(1, currentPage - 2); i <= Math.min(totalPages, currentPage + 2); i++) {
-        pagination += `<button class="${i === currentPage ? 'active' : ''}" onclick="changePage(${i})">${i}</button>`;
-    }
+    pagination += `<button ${prevCursor ? '' : 'disabled'} onclick="changePage('${prevCursor || ''}')">Previous</button>`;
     
     // Next button
-    pagination += `<button ${currentPage === totalPages ? 'disabled' : ''} onclick="changePage(${currentPage + 1})">Next</button>`;
+    pagination += `<button ${nextCursor ? '' : 'disabled'} onclick="changePage('${nextCursor || ''}')">Next</button>`;
     
     pagination += '</div>';
     container.innerHTML = pagination;
 }
 
-function changePage(page) {
-    currentPage = page;
+function changePage(cursor) {
+    ticketsCursor = cursor;
     loadTickets();
 }
 
@@ -1008,6 +1162,11 @@ function initializeWebSocket() {
     socket.on('connect', function() {
         console.log('Connected to WebSocket');
         showToast('Real-time notifications enabled', 'success');
+        
+        // Catch up on anything missed while disconnected
+        if (changesToken) {
+            syncTicketChanges();
+        }
     });
     
     socket.on('disconnect', function() {
@@ -1026,9 +1185,9 @@ function initializeWebSocket() {
                 loadDashboard();
             }
             
-            // Refresh tickets list if visible
+            // Patch the tickets list if visible
             if (currentSection === 'tickets') {
-                loadTickets();
+                syncTicketChanges();
             }
         }
     });
@@ -1042,7 +1201,7 @@ function initializeWebSocket() {
         if (currentSection === 'dashboard') {
             loadDashboard();
         } else if (currentSection === 'tickets') {
-            loadTickets();
+            syncTicketChanges();
         }
         
         // Update modal if open
@@ -1075,7 +1234,7 @@ function initializeWebSocket() {
             if (currentSection === 'dashboard') {
                 loadDashboard();
             } else if (currentSection === 'tickets') {
-                loadTickets();
+                syncTicketChanges();
             }
         }
     });
@@ -0,0 +1,65 @@
+import hashlib
+import os
+import tempfile
+
+# Bytes read from the request and hashed per step; a file is never held whole
+CHUNK_SIZE = 64 * 1024
+
+class AttachmentTooLarge(Exception):
+    pass
+
+class AttachmentStore:
+    """Content-addressed file storage
+
+    A file is stored under its SHA-256 at root/ab/cd/abcd..., so the same
+    content uploaded many times takes disk space once. Uploads are
+    streamed into a temporary file in the same root while being hashed,
+    then renamed into place, so a reader never sees a partial file.
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+
+    def init_app(self, app):
+        self.root = app.config['ATTACHMENT_FOLDER']
+
+    def relative_path(self, sha256):
+        return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+    def path(self, sha256):
+        return os.path.join(self.root, self.relative_path(sha256))
+
+    def save(self, stream, max_size=None):
+        """Copy `stream` into the store chunk by chunk; returns (sha256, size)"""
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_size and size > max_size:
+                        raise AttachmentTooLarge(f'Attachment exceeds {max_size} bytes')
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            sha256 = digest.hexdigest()
+            path = self.path(sha256)
+            if os.path.exists(path):
+                # Already stored: keep the existing copy
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return sha256, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+attachment_store = AttachmentStore()
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from src.models.user import User
+
+DEFAULT_TTL = 60
+
+# The only user fields authorization checks look at
+AuthInfo = namedtuple('AuthInfo', ['id', 'role', 'department_id', 'is_active'])
+
+class AuthCache:
+    """Per-process TTL cache of AuthInfo keyed by user id"""
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # user id -> (expires at, AuthInfo)
+        self._generation = 0  # Bumped by every invalidation
+
+    def get(self, user_id):
+        """Cached AuthInfo, loading it on a miss; None for unknown users"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            generation = self._generation
+        if entry and entry[0] > now:
+            return entry[1]
+
+        row = User.query.with_entities(
+            User.id, User.role, User.department_id, User.is_active
+        ).filter_by(id=user_id).first()
+        if row is None:
+            return None
+
+        info = AuthInfo(row.id, row.role, row.department_id, row.is_active)
+        with self._lock:
+            # A row read before a concurrent invalidation may already be stale
+            if generation == self._generation:
+                self._entries[user_id] = (now + self.ttl, info)
+        return info
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+auth_cache = AuthCache()
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_write(mapper, connection, user):
+    """Role, department or active-flag changes must not outlive the write"""
+    session = object_session(user)
+    if session is not None:
+        session.info.setdefault('auth_invalidate', set()).add(user.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    # Only once committed: earlier, a concurrent request could cache the old row again
+    for user_id in session.info.pop('auth_invalidate', ()):
+        auth_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_invalidations(session):
+    session.info.pop('auth_invalidate', None)
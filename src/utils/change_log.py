@@ -0,0 +1,185 @@
+import base64
+import json
+from flask import has_request_context, session as request_session
+from sqlalchemy import event, inspect, select, text, update
+from sqlalchemy.dialects.postgresql import insert as postgres_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from src.models.user import db, Ticket, TicketResponse, IdCounter
+from src.utils.ticket_reads import mark_ticket_read
+
+COUNTER_NAME = 'change_seq'
+# change_seq of the last commit that took a ticket out of a listing scope
+REMOVAL_COUNTER_NAME = 'ticket_scope_removal'
+# A ticket whose value for one of these changes leaves a listing scope
+SCOPE_COLUMNS = ('student_id', 'department_id')
+BACKFILL_BATCH = 500
+
+def next_change_seq(conn):
+    """Take the next change sequence value inside the caller's transaction
+
+    The counter row stays locked until that transaction ends, so values
+    become visible in commit order: a reader that has seen value N will
+    never later find a committed change numbered below N.
+    """
+    dialect_insert = {'postgresql': postgres_insert, 'sqlite': sqlite_insert}.get(conn.dialect.name)
+    if dialect_insert is None:
+        conn.execute(
+            update(IdCounter).where(IdCounter.name == COUNTER_NAME).values(next_value=IdCounter.next_value + 1)
+        )
+        return conn.execute(select(IdCounter.next_value).where(IdCounter.name == COUNTER_NAME)).scalar()
+
+    stmt = dialect_insert(IdCounter).values(name=COUNTER_NAME, next_value=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'next_value': IdCounter.next_value + 1}
+    ).returning(IdCounter.next_value)
+    return conn.execute(stmt).scalar()
+
+def current_change_seq():
+    """Highest committed change sequence value"""
+    return db.session.execute(
+        select(IdCounter.next_value).where(IdCounter.name == COUNTER_NAME)
+    ).scalar() or 0
+
+def last_scope_removal():
+    """change_seq of the last commit that deleted a ticket or moved one out of a scope"""
+    return db.session.execute(
+        select(IdCounter.next_value).where(IdCounter.name == REMOVAL_COUNTER_NAME)
+    ).scalar() or 0
+
+def _record_scope_removal(conn, seq):
+    updated = conn.execute(
+        update(IdCounter).where(IdCounter.name == REMOVAL_COUNTER_NAME).values(next_value=seq)
+    ).rowcount
+    if not updated:
+        conn.execute(IdCounter.__table__.insert().values(name=REMOVAL_COUNTER_NAME, next_value=seq))
+
+def encode_change_token(seq):
+    return base64.urlsafe_b64encode(json.dumps({'s': seq}).encode()).decode()
+
+def decode_change_token(token):
+    try:
+        seq = json.loads(base64.urlsafe_b64decode(token.encode()))['s']
+    except Exception:
+        raise ValueError('Invalid sync token')
+    if not isinstance(seq, int) or seq < 0:
+        raise ValueError('Invalid sync token')
+    return seq
+
+def ensure_change_tracking():
+    """Add change_seq to tables that predate it and number existing rows"""
+    with db.engine.begin() as conn:
+        for model in (Ticket, TicketResponse):
+            table = model.__tablename__
+            columns = {column['name'] for column in inspect(conn).get_columns(table)}
+            if 'change_seq' not in columns:
+                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN change_seq BIGINT'))
+
+        seq = conn.execute(
+            select(IdCounter.next_value).where(IdCounter.name == COUNTER_NAME)
+        ).scalar() or 0
+        # Oldest changes first, so the numbering follows updated_at
+        ids = conn.execute(
+            select(Ticket.id).where(Ticket.change_seq.is_(None)).order_by(Ticket.updated_at, Ticket.id)
+        ).scalars().all()
+        for start in range(0, len(ids), BACKFILL_BATCH):
+            batch = ids[start:start + BACKFILL_BATCH]
+            conn.execute(
+                update(Ticket.__table__).where(Ticket.__table__.c.id == db.bindparam('row_id'))
+                .values(change_seq=db.bindparam('seq')),
+                [{'row_id': row_id, 'seq': seq + offset + 1} for offset, row_id in enumerate(batch)]
+            )
+            seq += len(batch)
+        # Existing responses belong to their ticket's last change
+        conn.execute(
+            update(TicketResponse)
+            .where(TicketResponse.change_seq.is_(None))
+            .values(change_seq=select(Ticket.change_seq).where(Ticket.id == TicketResponse.ticket_id).scalar_subquery())
+        )
+        if seq:
+            # Bring the counter up to the backfilled rows
+            updated = conn.execute(
+                update(IdCounter).where(IdCounter.name == COUNTER_NAME).values(next_value=seq)
+            ).rowcount
+            if not updated:
+                conn.execute(IdCounter.__table__.insert().values(name=COUNTER_NAME, next_value=seq))
+
+    for model in (Ticket, TicketResponse):
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changes(session, flush_context, instances):
+    """Remember every ticket and new response this transaction writes; numbered at commit"""
+    tickets = [
+        obj for obj in session.dirty
+        if isinstance(obj, Ticket) and session.is_modified(obj, include_collections=False)
+    ]
+    tickets += [obj for obj in session.new if isinstance(obj, Ticket)]
+    responses = [obj for obj in session.new if isinstance(obj, TicketResponse)]
+    if any(isinstance(obj, Ticket) for obj in session.deleted) or any(
+        inspect(ticket).attrs[name].history.deleted for ticket in tickets for name in SCOPE_COLUMNS
+    ):
+        session.info['scope_removal'] = True
+    if not tickets and not responses:
+        return
+
+    with session.no_autoflush:
+        for response in responses:
+            # A new response changes its ticket too
+            ticket = response.ticket or session.get(Ticket, response.ticket_id)
+            if ticket is not None:
+                tickets.append(ticket)
+
+    changed = session.info.setdefault('changed', [])
+    changed.extend(obj for obj in tickets + responses if not any(obj is seen for seen in changed))
+
+    # The author has seen their own change
+    if has_request_context() and request_session.get('user_id'):
+        session.info['changed_by'] = request_session['user_id']
+
+def stamp_changes(session):
+    """Give this transaction's tickets and new responses one new change_seq
+
+    Runs from before_commit, so the counter row is only locked for the
+    end of the transaction rather than from its first write; other
+    hooks that need the value may call it earlier. Returns the value,
+    or None when nothing changed.
+    """
+    if session.info.get('changed') or session.info.get('scope_removal'):
+        session.flush()
+    changed = session.info.pop('changed', None) or []
+    removal = session.info.pop('scope_removal', None)
+    if not changed and not removal:
+        return session.info.get('change_seq')
+
+    conn = session.connection()
+    seq = next_change_seq(conn)
+    if removal:
+        _record_scope_removal(conn, seq)
+    for model in (Ticket, TicketResponse):
+        ids = [obj.id for obj in changed if isinstance(obj, model)]
+        if ids:
+            conn.execute(update(model.__table__).where(model.__table__.c.id.in_(ids)).values(change_seq=seq))
+    for obj in changed:
+        set_committed_value(obj, 'change_seq', seq)
+    session.info['change_seq'] = seq
+
+    user_id = session.info.pop('changed_by', None)
+    if user_id is not None:
+        for ticket in changed:
+            if isinstance(ticket, Ticket):
+                mark_ticket_read(conn, user_id, ticket.id, seq)
+    return seq
+
+@event.listens_for(Session, 'before_commit')
+def _stamp_changes(session):
+    stamp_changes(session)
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _forget_changes(session):
+    for key in ('changed', 'changed_by', 'change_seq', 'scope_removal'):
+        session.info.pop(key, None)
@@ -0,0 +1,69 @@
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # gzip only
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_LEVEL = 6
+# Dynamic responses favour speed; static assets are precompressed at 11
+DEFAULT_BROTLI_QUALITY = 4
+COMPRESSIBLE_TYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'text/javascript'}
+
+class ResponseCompressor:
+    """Compresses API responses over `min_size` bytes in the encoding the client prefers
+
+    Only whole, uncompressed bodies are touched: files sent with
+    send_file() and precompressed static assets pass through as they are.
+    A strong ETag is sent weak instead: the compressed bytes are the same
+    content, and the views' weak If-None-Match comparison still matches
+    the value a client sends back.
+    """
+
+    def __init__(self, min_size=DEFAULT_MIN_SIZE, level=DEFAULT_LEVEL, brotli_quality=DEFAULT_BROTLI_QUALITY):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+
+    def init_app(self, app):
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.level = app.config.get('COMPRESS_LEVEL', self.level)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', self.brotli_quality)
+        app.after_request(self.compress)
+
+    def choose_encoding(self, accept_encodings):
+        if brotli is not None and accept_encodings['br']:
+            return 'br'
+        if accept_encodings['gzip']:
+            return 'gzip'
+        return None
+
+    def compress(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+        encoding = self.choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, self.level, mtime=0)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+response_compressor = ResponseCompressor()
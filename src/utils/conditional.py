@@ -0,0 +1,24 @@
+import hashlib
+import json
+from flask import current_app, request
+
+def version_etag(*parts):
+    """ETag for a response that is fully determined by `parts`"""
+    return hashlib.sha1(json.dumps(parts, default=str, sort_keys=True).encode()).hexdigest()[:20]
+
+def set_validators(response, etag):
+    """Weak ETag; private and always revalidated, so a 304 is the usual reply
+
+    No Last-Modified: not every write moves updated_at, while every one
+    moves the change_seq behind the ETag.
+    """
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def not_modified(etag):
+    """A 304 response when the client's If-None-Match holds the current ETag, else None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return set_validators(current_app.response_class(status=304), etag)
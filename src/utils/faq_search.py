@@ -0,0 +1,197 @@
+import math
+from sqlalchemy import event, inspect, text
+from src.models.user import db, FAQ
+from src.utils.fulltext import TS_CONFIG, tokenize, fts5_query, ts_query, fts5_available, sqlite_table_exists
+from src.utils.serialization import with_faq_relations
+
+# How much popularity lifts relevance: score = relevance * (1 + w * ln(1 + views))
+VIEW_COUNT_WEIGHT = 0.15
+# Relevance-ordered candidates fetched per requested result before blending
+CANDIDATE_FACTOR = 5
+
+FTS_TABLE = 'faq_search'
+
+class SQLiteFAQSearch:
+    """FTS5 table holding the active FAQs, rowid = faqs.id"""
+
+    def ensure_index(self, conn):
+        if sqlite_table_exists(conn, FTS_TABLE):
+            return
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "question, answer, tokenize = 'porter unicode61')"
+        ))
+        conn.execute(text(
+            f"INSERT INTO {FTS_TABLE} (rowid, question, answer) "
+            "SELECT id, question, answer FROM faqs WHERE is_active"
+        ))
+
+    def sync(self, conn, faq):
+        conn.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': faq.id})
+        if faq.is_active:
+            conn.execute(
+                text(f'INSERT INTO {FTS_TABLE} (rowid, question, answer) VALUES (:id, :question, :answer)'),
+                {'id': faq.id, 'question': faq.question, 'answer': faq.answer}
+            )
+
+    def remove(self, conn, faq_id):
+        conn.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': faq_id})
+
+    def candidates(self, tokens, category_id, limit):
+        sql = (
+            f"SELECT faqs.id, -bm25({FTS_TABLE}, 2.0, 1.0) AS relevance "
+            f"FROM {FTS_TABLE} JOIN faqs ON faqs.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :query AND faqs.is_active"
+        )
+        params = {'query': fts5_query(tokens)}
+        if category_id:
+            sql += ' AND faqs.category_id = :category_id'
+            params['category_id'] = category_id
+        sql += f' ORDER BY bm25({FTS_TABLE}, 2.0, 1.0)'
+        if limit:
+            sql += ' LIMIT :limit'
+            params['limit'] = limit
+        return db.session.execute(text(sql), params).fetchall()
+
+class PostgresFAQSearch:
+    """Weighted tsvector generated column on faqs with a GIN index"""
+
+    def ensure_index(self, conn):
+        conn.execute(text(
+            "ALTER TABLE faqs ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS (setweight(to_tsvector('{TS_CONFIG}', coalesce(question, '')), 'A') || "
+            f"setweight(to_tsvector('{TS_CONFIG}', coalesce(answer, '')), 'B')) STORED"
+        ))
+        conn.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_faqs_search_vector ON faqs USING GIN (search_vector)'
+        ))
+
+    def sync(self, conn, faq):
+        pass  # The generated column follows every insert and update
+
+    def remove(self, conn, faq_id):
+        pass
+
+    def candidates(self, tokens, category_id, limit):
+        sql = (
+            "SELECT faqs.id, ts_rank_cd(faqs.search_vector, query) AS relevance "
+            f"FROM faqs, to_tsquery('{TS_CONFIG}', :query) AS query "
+            "WHERE faqs.search_vector @@ query AND faqs.is_active"
+        )
+        params = {'query': ts_query(tokens)}
+        if category_id:
+            sql += ' AND faqs.category_id = :category_id'
+            params['category_id'] = category_id
+        sql += ' ORDER BY relevance DESC'
+        if limit:
+            sql += ' LIMIT :limit'
+            params['limit'] = limit
+        return db.session.execute(text(sql), params).fetchall()
+
+class LikeFAQSearch:
+    """Fallback for SQLite builds without FTS5: substring match, popularity only"""
+
+    def ensure_index(self, conn):
+        pass
+
+    def sync(self, conn, faq):
+        pass
+
+    def remove(self, conn, faq_id):
+        pass
+
+    def candidates(self, tokens, category_id, limit):
+        query = FAQ.query.with_entities(FAQ.id).filter(FAQ.is_active == True)
+        for token in tokens:
+            query = query.filter(FAQ.question.contains(token) | FAQ.answer.contains(token))
+        if category_id:
+            query = query.filter_by(category_id=category_id)
+        query = query.order_by(FAQ.view_count.desc())
+        if limit:
+            query = query.limit(limit)
+        return [(row.id, 1.0) for row in query]
+
+_backends = {}  # engine url -> backend once its index exists
+
+def _backend_for(conn):
+    if conn.dialect.name == 'postgresql':
+        return PostgresFAQSearch()
+    if conn.dialect.name == 'sqlite' and fts5_available(conn):
+        return SQLiteFAQSearch()
+    return LikeFAQSearch()
+
+def ensure_faq_search_index():
+    """Create (and on SQLite, populate) the FAQ search index if missing"""
+    with db.engine.begin() as conn:
+        backend = _backend_for(conn)
+        backend.ensure_index(conn)
+    _backends[str(db.engine.url)] = backend
+    return backend
+
+def _backend(connection):
+    """The backend whose index already exists on this connection's database
+
+    Found from the dialect and the schema, never by creating anything, so
+    a worker that never ran ensure_faq_search_index() still keeps the
+    index in step with its writes.
+    """
+    key = str(connection.engine.url)
+    backend = _backends.get(key)
+    if backend is None:
+        if connection.dialect.name == 'postgresql':
+            backend = PostgresFAQSearch()
+        elif connection.dialect.name == 'sqlite' and sqlite_table_exists(connection, FTS_TABLE):
+            backend = SQLiteFAQSearch()
+        else:
+            return None  # Nothing to keep in step until the index is created
+        _backends[key] = backend
+    return backend
+
+def faq_search_backend():
+    return _backends.get(str(db.engine.url)) or ensure_faq_search_index()
+
+def search_faqs(query, category_id=None, limit=10):
+    """Active FAQs matching `query`, best first
+
+    Every token must match; the last one also matches as a prefix so the
+    search works while the user is typing. Text relevance is blended with
+    view_count so popular answers win between similar matches.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    backend = faq_search_backend()
+    candidate_limit = limit * CANDIDATE_FACTOR if limit else None
+    relevance = {row[0]: float(row[1] or 0) for row in backend.candidates(tokens, category_id, candidate_limit)}
+    if not relevance:
+        return []
+
+    faqs = with_faq_relations(FAQ.query).filter(FAQ.id.in_(list(relevance))).all()
+    faqs.sort(
+        key=lambda faq: relevance[faq.id] * (1 + VIEW_COUNT_WEIGHT * math.log1p(faq.view_count or 0)),
+        reverse=True
+    )
+    return faqs[:limit] if limit else faqs
+
+@event.listens_for(FAQ, 'after_insert')
+def _index_faq(mapper, connection, faq):
+    """Index writes go out on the FAQ's own connection, inside its transaction"""
+    backend = _backend(connection)
+    if backend is not None:
+        backend.sync(connection, faq)
+
+@event.listens_for(FAQ, 'after_update')
+def _reindex_faq(mapper, connection, faq):
+    backend = _backend(connection)
+    if backend is None:
+        return
+    state = inspect(faq)
+    if any(state.attrs[name].history.has_changes() for name in ('question', 'answer', 'is_active')):
+        backend.sync(connection, faq)
+
+@event.listens_for(FAQ, 'after_delete')
+def _remove_faq(mapper, connection, faq):
+    backend = _backend(connection)
+    if backend is not None:
+        backend.remove(connection, faq.id)
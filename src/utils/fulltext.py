@@ -0,0 +1,33 @@
+import re
+from sqlalchemy import text
+
+# Postgres text search configuration used for every tsvector/tsquery
+TS_CONFIG = 'english'
+
+def tokenize(query):
+    """Lower-cased word tokens of a user query, with FTS operators stripped"""
+    return re.findall(r'\w+', (query or '').lower())
+
+def fts5_query(tokens, prefix=True):
+    """SQLite FTS5 MATCH expression; the last token matches as a prefix"""
+    terms = [f'"{token}"' for token in tokens]
+    if prefix and terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+def ts_query(tokens, prefix=True):
+    """Postgres to_tsquery() expression; the last token matches as a prefix"""
+    terms = list(tokens)
+    if prefix and terms:
+        terms[-1] += ':*'
+    return ' & '.join(terms)
+
+def fts5_available(conn):
+    """True if this SQLite build ships the FTS5 extension"""
+    options = {row[0] for row in conn.execute(text('PRAGMA compile_options'))}
+    return 'ENABLE_FTS5' in options
+
+def sqlite_table_exists(conn, name):
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': name}
+    ).first() is not None
@@ -0,0 +1,43 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Falls back to the stdlib encoder
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed
+
+    orjson writes UTF-8 bytes directly, so response() skips the str round
+    trip. Anything orjson refuses (integers over 64 bits, non-string keys)
+    and pretty-printed debug output go through the stdlib encoder, with
+    the same defaults for dates, UUIDs and dataclasses.
+    """
+
+    def _orjson_options(self):
+        return orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+
+    def _encode(self, obj):
+        """Compact JSON bytes for `obj`"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._orjson_options())
+            except TypeError:
+                pass
+        return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs or orjson is None:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs or orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj) + b'\n', mimetype=self.mimetype)
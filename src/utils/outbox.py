@@ -0,0 +1,270 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, or_, select, update
+from sqlalchemy.orm import Session
+from src.models.user import db, OutboxEvent
+from src.utils.change_log import stamp_changes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50
+# The dispatcher also wakes right after a commit that queued events
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_MAX_ATTEMPTS = 8
+# Retry backoff: RETRY_BASE ** attempts seconds, capped at RETRY_MAX
+RETRY_BASE = 2
+RETRY_MAX = 300
+# A claimed batch is handed to another dispatcher if not finished within this
+LEASE_SECONDS = 60
+# Sent events are kept this long, then deleted in batches once per PRUNE_INTERVAL
+DEFAULT_RETENTION_DAYS = 7
+PRUNE_INTERVAL = 3600
+PRUNE_BATCH = 1000
+
+class Outbox:
+    """Transactional outbox for notifications
+
+    enqueue() adds an OutboxEvent to the caller's session, so the event is
+    committed (or rolled back) together with the change it announces. A
+    background thread per worker claims due events in batches, passes each
+    to the handler registered for its channel, and marks it sent or
+    schedules a retry with exponential backoff. Claims are leases, so
+    several workers can drain the same table and a crashed worker's batch
+    is picked up again. Handlers get the idempotency key so receivers can
+    drop the rare duplicate delivery. Sent events are pruned after
+    `retention_days`; failed ones are kept for inspection.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, poll_interval=DEFAULT_POLL_INTERVAL,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, retention_days=DEFAULT_RETENTION_DAYS):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retention_days = retention_days
+        self.app = None
+        self.handlers = {}  # channel -> handler(event, data, idempotency_key, delivery)
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stats = {}
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('OUTBOX_BATCH_SIZE', self.batch_size)
+        self.poll_interval = app.config.get('OUTBOX_POLL_INTERVAL', self.poll_interval)
+        self.max_attempts = app.config.get('OUTBOX_MAX_ATTEMPTS', self.max_attempts)
+        self.retention_days = app.config.get('OUTBOX_RETENTION_DAYS', self.retention_days)
+        app.before_request(self.start)
+
+    def register(self, channel, handler):
+        self.handlers[channel] = handler
+
+    def enqueue(self, channel, event_name, data, key=None, ticket=None):
+        """Add an event to the current transaction; a known `key` is not queued twice
+
+        With `ticket`, the key is derived from the change it announces,
+        '<event>:<ticket id>:<change_seq>', once the commit numbers it.
+        """
+        if key is not None:
+            existing = OutboxEvent.query.filter_by(idempotency_key=key).first()
+            if existing is not None:
+                return existing
+        outbox_event = OutboxEvent(
+            idempotency_key=key or uuid.uuid4().hex,
+            channel=channel,
+            event=event_name,
+            payload=json.dumps(data)
+        )
+        db.session.add(outbox_event)
+        db.session.info['outbox_queued'] = True
+        if ticket is not None:
+            db.session.info.setdefault('outbox_change_keys', []).append((outbox_event, ticket))
+        return outbox_event
+
+    def start(self):
+        """Start this worker's dispatcher thread; a forked worker starts its own"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stats = {'delivered': 0, 'retried': 0, 'failed': 0, 'last_lag': None, 'max_lag': 0.0}
+            threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True).start()
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        last_prune = None
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                while self.drain() == self.batch_size:
+                    pass  # Keep going while batches come back full
+                if last_prune is None or time.monotonic() - last_prune >= PRUNE_INTERVAL:
+                    last_prune = time.monotonic()
+                    with self.app.app_context():
+                        self.prune()
+            except Exception:
+                logger.exception('Outbox dispatch failed')
+
+    def drain(self):
+        """Claim and deliver one batch of due events; returns the batch size"""
+        with self.app.app_context():
+            batch = self._claim()
+            for outbox_event in batch:
+                self._deliver(outbox_event)
+        return len(batch)
+
+    def _claim(self):
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        claimable = or_(OutboxEvent.locked_until.is_(None), OutboxEvent.locked_until < now)
+        due = (
+            select(OutboxEvent.id)
+            .where(OutboxEvent.status == 'pending', OutboxEvent.next_attempt_at <= now, claimable)
+            .order_by(OutboxEvent.id)
+            .limit(self.batch_size)
+        )
+        with db.engine.begin() as conn:
+            # The outer conditions are re-checked against rows another worker just claimed
+            conn.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(due), OutboxEvent.status == 'pending', claimable)
+                .values(locked_by=token, locked_until=now + timedelta(seconds=LEASE_SECONDS))
+                .execution_options(synchronize_session=False)
+            )
+            return conn.execute(
+                select(OutboxEvent.__table__).where(OutboxEvent.locked_by == token).order_by(OutboxEvent.id)
+            ).fetchall()
+
+    def _deliver(self, outbox_event):
+        delivery = Delivery(self, outbox_event)
+        try:
+            handler = self.handlers.get(outbox_event.channel)
+            if handler is None:
+                raise RuntimeError(f'No outbox handler for channel {outbox_event.channel}')
+            handler(outbox_event.event, json.loads(outbox_event.payload), outbox_event.idempotency_key, delivery)
+        except Exception as e:
+            self._finish(outbox_event, e)
+        else:
+            if not delivery.deferred:
+                self._finish(outbox_event)
+
+    def _finish(self, outbox_event, error=None):
+        """Mark a claimed event sent, or schedule its retry; a lease another dispatcher took over is left alone"""
+        values = {'attempts': outbox_event.attempts + 1, 'locked_by': None, 'locked_until': None}
+        if error is not None:
+            values['last_error'] = str(error)
+            if values['attempts'] >= self.max_attempts:
+                values['status'] = 'failed'
+                self._stats['failed'] += 1
+            else:
+                delay = min(RETRY_BASE ** values['attempts'], RETRY_MAX)
+                values['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=delay)
+                self._stats['retried'] += 1
+        else:
+            values['status'] = 'sent'
+            values['sent_at'] = datetime.utcnow()
+            lag = (values['sent_at'] - outbox_event.created_at).total_seconds()
+            self._stats['delivered'] += 1
+            self._stats['last_lag'] = lag
+            self._stats['max_lag'] = max(self._stats['max_lag'], lag)
+
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id == outbox_event.id, OutboxEvent.locked_by == outbox_event.locked_by)
+                .values(**values)
+            )
+
+    def prune(self, older_than_days=None):
+        """Delete sent events older than the retention period; returns how many"""
+        days = self.retention_days if older_than_days is None else older_than_days
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        expired = (
+            select(OutboxEvent.id)
+            .where(OutboxEvent.status == 'sent', OutboxEvent.sent_at < cutoff)
+            .limit(PRUNE_BATCH)
+        )
+        deleted = 0
+        while True:
+            # Short transactions, so dispatchers are not held up by a large backlog
+            with db.engine.begin() as conn:
+                count = conn.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(expired))).rowcount
+            deleted += count
+            if count < PRUNE_BATCH:
+                return deleted
+
+    def metrics(self):
+        """Backlog and lag: pending/failed counts, age of the oldest pending event, this worker's deliveries"""
+        rows = dict(
+            db.session.query(OutboxEvent.status, func.count(OutboxEvent.id))
+            .filter(OutboxEvent.status.in_(['pending', 'failed']))
+            .group_by(OutboxEvent.status)
+            .all()
+        )
+        oldest = db.session.query(func.min(OutboxEvent.created_at)).filter(OutboxEvent.status == 'pending').scalar()
+        return {
+            'pending': rows.get('pending', 0),
+            'failed': rows.get('failed', 0),
+            'oldest_pending_age': (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+            'worker': dict(self._stats)
+        }
+
+class Delivery:
+    """Handed to a handler with its event; defer() keeps the event leased until done() or failed()
+
+    For handlers that send later, such as coalesced notifications: if the
+    process dies first, the lease runs out and another dispatcher sends
+    the event again.
+    """
+
+    def __init__(self, outbox, outbox_event):
+        self.outbox = outbox
+        self.outbox_event = outbox_event
+        self.deferred = False
+
+    def defer(self):
+        self.deferred = True
+        return self
+
+    def done(self):
+        with self.outbox.app.app_context():
+            self.outbox._finish(self.outbox_event)
+
+    def failed(self, error):
+        with self.outbox.app.app_context():
+            self.outbox._finish(self.outbox_event, error)
+
+outbox = Outbox()
+
+@event.listens_for(Session, 'before_commit')
+def _derive_change_keys(session):
+    """Key change notifications by event, ticket and the change_seq this commit takes"""
+    keyed = session.info.pop('outbox_change_keys', None)
+    if not keyed:
+        return
+    stamp_changes(session)
+    seen = {}
+    for outbox_event, ticket in keyed:
+        key = f'{outbox_event.event}:{ticket.id}:{ticket.change_seq}'
+        # Two events of one kind for the same change get numbered suffixes
+        seen[key] = seen.get(key, 0) + 1
+        outbox_event.idempotency_key = key if seen[key] == 1 else f'{key}:{seen[key]}'
+
+@event.listens_for(Session, 'after_commit')
+def _wake_dispatcher(session):
+    if session.info.pop('outbox_queued', None):
+        outbox.wake()
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_queued(session):
+    session.info.pop('outbox_queued', None)
+    session.info.pop('outbox_change_keys', None)
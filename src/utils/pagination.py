@@ -0,0 +1,80 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+def encode_cursor(item, direction='next'):
+    """Opaque cursor pointing just past `item` in the given direction"""
+    payload = json.dumps({
+        'c': item.created_at.isoformat() if item.created_at else None,
+        'i': item.id,
+        'd': direction
+    }, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Return (created_at, id, direction) or raise ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = datetime.fromisoformat(payload['c']) if payload['c'] else None
+        direction = payload.get('d', 'next')
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return created_at, int(payload['i']), direction
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def wants_cursor(args):
+    """True when a listing request asks for cursor mode"""
+    return 'cursor' in args or 'limit' in args
+
+def keyset_paginate(query, model, cursor=None, limit=DEFAULT_LIMIT):
+    """Newest-first page ordered by (created_at, id) without COUNT or OFFSET
+
+    Returns a dict with the page `items`, `next_cursor`/`prev_cursor`
+    (None when there is nothing further that way) and `has_more`.
+    """
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    key = tuple_(model.created_at, model.id)
+
+    direction = 'next'
+    if cursor:
+        created_at, item_id, direction = decode_cursor(cursor)
+        if direction == 'next':
+            query = query.filter(key < tuple_(created_at, item_id))
+        else:
+            query = query.filter(key > tuple_(created_at, item_id))
+
+    if direction == 'next':
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at.asc(), model.id.asc())
+
+    rows = query.limit(limit + 1).all()
+    more = len(rows) > limit
+    items = rows[:limit]
+
+    if direction == 'next':
+        has_next = more
+        has_prev = bool(cursor)
+    else:
+        items.reverse()
+        has_next = True
+        has_prev = more
+
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(items[-1], 'next') if items and has_next else None,
+        'prev_cursor': encode_cursor(items[0], 'prev') if items and has_prev else None,
+        'has_more': bool(items) and has_next
+    }
+
+def offset_page(query, page, per_page):
+    """page/per_page slice that reports has_more instead of running COUNT(*)"""
+    page = max(page, 1)
+    rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    return rows[:per_page], len(rows) > per_page
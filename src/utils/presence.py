@@ -0,0 +1,323 @@
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, Float, String, create_engine, event, select, insert, update, delete, func
+)
+from sqlalchemy.dialects import postgresql, sqlite
+
+logger = logging.getLogger(__name__)
+
+# Every worker refreshes its row this often; workers silent for WORKER_TTL are swept
+HEARTBEAT_INTERVAL = 15
+WORKER_TTL = 60
+
+class LocalPresenceStore:
+    """Online users of this process: sid sets per user plus running counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sessions = {}  # sid -> user id
+        self.users = {}  # user id -> display fields
+        self.sids = {}  # user id -> set of sids
+        self.by_role = Counter()
+        self.by_department = Counter()
+
+    def connect(self, sid, info):
+        with self._lock:
+            user_id = info['id']
+            self.sessions[sid] = user_id
+            sids = self.sids.setdefault(user_id, set())
+            sids.add(sid)
+            if len(sids) > 1:
+                return False
+            self.users[user_id] = info
+            self._count(info, 1)
+            return True
+
+    def disconnect(self, sid):
+        with self._lock:
+            user_id = self.sessions.pop(sid, None)
+            if user_id is None:
+                return None
+            sids = self.sids[user_id]
+            sids.discard(sid)
+            if sids:
+                return None
+            del self.sids[user_id]
+            info = self.users.pop(user_id)
+            self._count(info, -1)
+            return info
+
+    def _count(self, info, delta):
+        for counter, key in ((self.by_role, info['role']), (self.by_department, info['department_id'])):
+            counter[key] += delta
+            if not counter[key]:
+                del counter[key]
+
+    def is_online(self, user_id):
+        return user_id in self.sids
+
+    def online_users(self):
+        with self._lock:
+            return list(self.users.values())
+
+    def counts(self):
+        with self._lock:
+            return {
+                'total': len(self.users),
+                'by_role': dict(self.by_role),
+                'by_department': {key: value for key, value in self.by_department.items() if key is not None}
+            }
+
+metadata = MetaData()
+
+presence_workers = Table(
+    'presence_workers', metadata,
+    Column('worker', String(32), primary_key=True),
+    Column('last_seen', Float, nullable=False)
+)
+presence_sessions = Table(
+    'presence_sessions', metadata,
+    Column('sid', String(64), primary_key=True),
+    Column('user_id', Integer, nullable=False),
+    Column('worker', String(32), nullable=False, index=True),
+    Column('connected_at', Float, nullable=False)
+)
+presence_users = Table(
+    'presence_users', metadata,
+    Column('user_id', Integer, primary_key=True),
+    Column('username', String(80)),
+    Column('full_name', String(100)),
+    Column('role', String(20), index=True),
+    Column('department_id', Integer, index=True),
+    Column('sessions', Integer, nullable=False)
+)
+
+class SQLPresenceStore:
+    """Online users shared by every worker through a database
+
+    Either a SQLite file on the host or, with a broker such as Redis, the
+    app's own database. Each worker process heartbeats every
+    HEARTBEAT_INTERVAL; sessions of a worker not seen for WORKER_TTL
+    (killed, OOM, lost host) are swept by the others, so crashed workers
+    do not leave users online forever.
+    """
+
+    def __init__(self, url, heartbeat_interval=HEARTBEAT_INTERVAL, worker_ttl=WORKER_TTL):
+        self.url = url
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_ttl = worker_ttl
+        self.worker = None
+        self._engine = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.clear_worker)
+
+    def _begin(self):
+        """A transaction on this process's engine; the first call per process sets up"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start_process()
+        return self._engine.begin()
+
+    def _start_process(self):
+        """Create the tables and start heartbeating; a forked worker gets its own id and pool"""
+        if self._engine is None:
+            if self.url.startswith('sqlite:'):
+                self._engine = create_engine(self.url, connect_args={'timeout': 10})
+                event.listen(self._engine, 'connect', _sqlite_wal)
+            else:
+                self._engine = create_engine(self.url, pool_pre_ping=True)
+            metadata.create_all(self._engine)
+        else:
+            self._engine.dispose(close=False)
+        self.worker = uuid.uuid4().hex
+        self._pid = os.getpid()
+        with self._engine.begin() as conn:
+            self._heartbeat(conn)
+        threading.Thread(target=self._run, name='presence-heartbeat', daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.heartbeat_interval)
+            try:
+                with self._engine.begin() as conn:
+                    self._heartbeat(conn)
+                self.sweep()
+            except Exception:
+                logger.exception('Presence heartbeat failed')
+
+    def _heartbeat(self, conn):
+        now = time.time()
+        updated = conn.execute(
+            update(presence_workers).where(presence_workers.c.worker == self.worker).values(last_seen=now)
+        ).rowcount
+        if not updated:
+            conn.execute(insert(presence_workers).values(worker=self.worker, last_seen=now))
+
+    def sweep(self):
+        """Drop the sessions of workers that stopped heartbeating; returns how many workers"""
+        with self._begin() as conn:
+            stale = conn.execute(
+                delete(presence_workers)
+                .where(presence_workers.c.last_seen < time.time() - self.worker_ttl)
+                .returning(presence_workers.c.worker)
+            ).scalars().all()
+            for worker in stale:
+                self._clear(conn, worker)
+        return len(stale)
+
+    def connect(self, sid, info):
+        with self._begin() as conn:
+            previous = conn.execute(
+                delete(presence_sessions).where(presence_sessions.c.sid == sid).returning(presence_sessions.c.user_id)
+            ).scalar()
+            if previous is not None:
+                self._release(conn, previous, 1)
+            conn.execute(insert(presence_sessions).values(
+                sid=sid, user_id=info['id'], worker=self.worker, connected_at=time.time()
+            ))
+            upsert = _insert_for(conn)(presence_users).values(
+                user_id=info['id'], username=info['username'], full_name=info['full_name'],
+                role=info['role'], department_id=info['department_id'], sessions=1
+            )
+            sessions = conn.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=[presence_users.c.user_id],
+                    set_={'sessions': presence_users.c.sessions + 1}
+                ).returning(presence_users.c.sessions)
+            ).scalar()
+        return sessions == 1
+
+    def disconnect(self, sid):
+        with self._begin() as conn:
+            user_id = conn.execute(
+                delete(presence_sessions).where(presence_sessions.c.sid == sid).returning(presence_sessions.c.user_id)
+            ).scalar()
+            if user_id is None:
+                return None
+            return self._release(conn, user_id, 1)
+
+    def _release(self, conn, user_id, count):
+        conn.execute(
+            update(presence_users)
+            .where(presence_users.c.user_id == user_id)
+            .values(sessions=presence_users.c.sessions - count)
+        )
+        row = conn.execute(
+            delete(presence_users)
+            .where(presence_users.c.user_id == user_id, presence_users.c.sessions <= 0)
+            .returning(*USER_COLUMNS)
+        ).first()
+        return _user_info(row) if row else None
+
+    def _clear(self, conn, worker):
+        user_ids = conn.execute(
+            delete(presence_sessions).where(presence_sessions.c.worker == worker).returning(presence_sessions.c.user_id)
+        ).scalars().all()
+        for user_id, count in Counter(user_ids).items():
+            self._release(conn, user_id, count)
+
+    def clear_worker(self):
+        """Drop every session this worker registered"""
+        if self._pid != os.getpid():
+            return
+        with self._begin() as conn:
+            conn.execute(delete(presence_workers).where(presence_workers.c.worker == self.worker))
+            self._clear(conn, self.worker)
+        self._pid = None  # Stops the heartbeat
+
+    def is_online(self, user_id):
+        with self._begin() as conn:
+            return conn.execute(
+                select(presence_users.c.user_id).where(presence_users.c.user_id == user_id)
+            ).first() is not None
+
+    def online_users(self):
+        with self._begin() as conn:
+            return [_user_info(row) for row in conn.execute(select(*USER_COLUMNS))]
+
+    def counts(self):
+        with self._begin() as conn:
+            by_role = dict(conn.execute(
+                select(presence_users.c.role, func.count()).group_by(presence_users.c.role)
+            ).all())
+            by_department = dict(conn.execute(
+                select(presence_users.c.department_id, func.count())
+                .where(presence_users.c.department_id.isnot(None))
+                .group_by(presence_users.c.department_id)
+            ).all())
+        return {'total': sum(by_role.values()), 'by_role': by_role, 'by_department': by_department}
+
+USER_COLUMNS = (
+    presence_users.c.user_id, presence_users.c.username, presence_users.c.full_name,
+    presence_users.c.role, presence_users.c.department_id
+)
+
+def _insert_for(conn):
+    """The dialect's INSERT, which has ON CONFLICT DO UPDATE"""
+    return postgresql.insert if conn.dialect.name == 'postgresql' else sqlite.insert
+
+def _sqlite_wal(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+def _user_info(row):
+    return {'id': row[0], 'username': row[1], 'full_name': row[2], 'role': row[3], 'department_id': row[4]}
+
+class PresenceRegistry:
+    """Who is online, by socket session, with display fields cached at connect
+
+    A user with several tabs open has one sid per tab and stays online
+    until the last one disconnects. Backed by this process's memory, or
+    by a database shared by every worker.
+    """
+
+    def __init__(self):
+        self.store = LocalPresenceStore()
+
+    def configure(self, url=None, database_url=None):
+        """Share presence between workers
+
+        A sqlite:///path.db url keeps it in that file. Any other url (a
+        Redis or AMQP broker, whose workers may be on other hosts) keeps it
+        in the app database at database_url. Without a url it stays local.
+        """
+        if url and url.startswith('sqlite:'):
+            self.store = SQLPresenceStore(url)
+        elif url and database_url:
+            self.store = SQLPresenceStore(database_url)
+        else:
+            self.store = LocalPresenceStore()
+
+    def connect(self, sid, user):
+        """Register a session; True if it is the user's first one"""
+        return self.store.connect(sid, {
+            'id': user.id,
+            'username': user.username,
+            'full_name': user.full_name,
+            'role': user.role,
+            'department_id': user.department_id
+        })
+
+    def disconnect(self, sid):
+        """Forget a session; returns the user's fields if it was their last one"""
+        return self.store.disconnect(sid)
+
+    def is_online(self, user_id):
+        return self.store.is_online(user_id)
+
+    def online_users(self):
+        return self.store.online_users()
+
+    def counts(self):
+        """Online user totals, per role and per department"""
+        return self.store.counts()
+
+presence = PresenceRegistry()
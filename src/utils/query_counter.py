@@ -0,0 +1,49 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from src.models.user import db
+
+class QueryCounter:
+    """Collects the SQL statements executed on an engine"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(engine=None):
+    """Count the queries executed inside the block (needs an app context)"""
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._record)
+
+@contextmanager
+def assert_max_queries(limit, engine=None):
+    """Fail if the block executes more than `limit` queries"""
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > limit:
+        raise AssertionError(
+            f'Expected at most {limit} queries, got {counter.count}:\n' + '\n'.join(counter.statements)
+        )
+
+def assert_endpoint_queries(client, url, limit, method='GET', **kwargs):
+    """Call an endpoint with a test client and assert its query budget
+
+    Must be called outside an app context: requests made inside one
+    share its flask.g, which hides per-request loads.
+    """
+    with client.application.app_context():
+        engine = db.engine
+    with assert_max_queries(limit, engine):
+        response = client.open(url, method=method, **kwargs)
+    return response
@@ -0,0 +1,91 @@
+import hashlib
+import threading
+import time
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from src.models.user import Department, TicketCategory
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_AGE = 300
+
+class ReferenceCache:
+    """Versioned, pre-encoded JSON body for a small, rarely written table
+
+    The body and its ETag are built once per version. Writes to the model
+    bump the version when their transaction commits; the TTL bounds how
+    long another worker process can serve an older version.
+    """
+
+    def __init__(self, key, loader, ttl=DEFAULT_TTL):
+        self.key = key
+        self.loader = loader
+        self.ttl = ttl
+        self.version = 0
+        self._lock = threading.Lock()
+        self._entry = None  # (version, expires at, body, etag)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entry = None
+
+    def get(self):
+        """Return (body, etag), rebuilding from the database if stale"""
+        now = time.monotonic()
+        entry = self._entry
+        if entry and entry[0] == self.version and entry[1] > now:
+            return entry[2], entry[3]
+
+        version = self.version
+        body = current_app.json.dumps({self.key: self.loader()}).encode()
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            if version == self.version:
+                self._entry = (version, now + self.ttl, body, etag)
+        return body, etag
+
+    def response(self, max_age=None):
+        """200 with ETag/Cache-Control, or 304 if the client's copy is current"""
+        body, etag = self.get()
+        if max_age is None:
+            max_age = current_app.config.get('REFERENCE_CACHE_MAX_AGE', DEFAULT_MAX_AGE)
+
+        response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = max_age
+        return response.make_conditional(request)
+
+def _active_departments():
+    return [dept.to_dict() for dept in Department.query.filter_by(is_active=True).all()]
+
+def _active_categories():
+    return [cat.to_dict() for cat in TicketCategory.query.filter_by(is_active=True).all()]
+
+departments_cache = ReferenceCache('departments', _active_departments)
+categories_cache = ReferenceCache('categories', _active_categories)
+
+CACHES_BY_MODEL = {
+    Department: departments_cache,
+    TicketCategory: categories_cache,
+}
+
+def _record_write(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('reference_writes', set()).add(type(target))
+
+for _model in CACHES_BY_MODEL:
+    event.listen(_model, 'after_insert', _record_write)
+    event.listen(_model, 'after_update', _record_write)
+    event.listen(_model, 'after_delete', _record_write)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    for model in session.info.pop('reference_writes', ()):
+        CACHES_BY_MODEL[model].invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('reference_writes', None)
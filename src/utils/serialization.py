@@ -0,0 +1,43 @@
+from sqlalchemy.orm import joinedload
+from src.models.user import Ticket, TicketResponse, FAQ
+
+def ticket_load_options():
+    """Loader options for everything Ticket.to_dict() touches"""
+    return (
+        joinedload(Ticket.student),
+        joinedload(Ticket.category),
+        joinedload(Ticket.department),
+        joinedload(Ticket.assigned_staff),
+    )
+
+def response_load_options():
+    """Loader options for everything TicketResponse.to_dict() touches"""
+    return (joinedload(TicketResponse.responder),)
+
+def faq_load_options():
+    """Loader options for everything FAQ.to_dict() touches"""
+    return (joinedload(FAQ.category),)
+
+def with_ticket_relations(query):
+    """Attach the ticket loader options to a Ticket query"""
+    return query.options(*ticket_load_options())
+
+def with_response_relations(query):
+    """Attach the response loader options to a TicketResponse query"""
+    return query.options(*response_load_options())
+
+def with_faq_relations(query):
+    """Attach the FAQ loader options to a FAQ query"""
+    return query.options(*faq_load_options())
+
+def serialize_tickets(tickets):
+    """Serialize tickets loaded with ticket_load_options()"""
+    return [ticket.to_dict() for ticket in tickets]
+
+def serialize_responses(responses):
+    """Serialize responses loaded with response_load_options()"""
+    return [response.to_dict() for response in responses]
+
+def serialize_faqs(faqs):
+    """Serialize FAQs loaded with faq_load_options()"""
+    return [faq.to_dict() for faq in faqs]
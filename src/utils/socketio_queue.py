@@ -0,0 +1,79 @@
+import pickle
+import sqlite3
+import threading
+import time
+from socketio import PubSubManager
+
+# How often listeners look for new messages, in seconds
+POLL_INTERVAL = 0.05
+# Messages older than this are pruned; every listener has read them by then
+RETENTION = 60
+PRUNE_EVERY = 500
+
+class SQLiteQueueManager(PubSubManager):
+    """Socket.IO pub/sub over a shared SQLite file
+
+    A stand-in for Redis/RabbitMQ when every worker runs on the same host:
+    each emit, room change and disconnect is appended to a table, and every
+    worker's listener polls for rows newer than the last one it has seen.
+    Use with SOCKETIO_MESSAGE_QUEUE=sqlite:///path/to/queue.db.
+    """
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///socketio-queue.db', channel='socketio', write_only=False,
+                 logger=None, json=None, poll_interval=POLL_INTERVAL):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = url.split(':///', 1)[1] if ':///' in url else url
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._published = 0
+        self._connect().close()  # Create the table up front
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS socketio_messages ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+            'payload BLOB NOT NULL, created_at REAL NOT NULL)'
+        )
+        return conn
+
+    def _publisher(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _publish(self, data):
+        conn = self._publisher()
+        conn.execute(
+            'INSERT INTO socketio_messages (channel, payload, created_at) VALUES (?, ?, ?)',
+            (self.channel, pickle.dumps(data), time.time())
+        )
+        self._published += 1
+        if self._published % PRUNE_EVERY == 0:
+            conn.execute('DELETE FROM socketio_messages WHERE created_at < ?', (time.time() - RETENTION,))
+
+    def _listen(self):
+        conn = self._connect()
+        last_id = conn.execute('SELECT coalesce(max(id), 0) FROM socketio_messages').fetchone()[0]
+        while True:
+            rows = conn.execute(
+                'SELECT id, payload FROM socketio_messages WHERE channel = ? AND id > ? ORDER BY id',
+                (self.channel, last_id)
+            ).fetchall()
+            for message_id, payload in rows:
+                last_id = message_id
+                yield pickle.loads(payload)
+            self.server.sleep(self.poll_interval)
+
+def local_queue_manager(url, channel='flask-socketio', write_only=False):
+    """Client manager for the message queues Flask-SocketIO has no backend for
+
+    Returns None for redis://, kafka://, zmq and amqp:// URLs (and for no
+    URL at all); Flask-SocketIO builds those itself from `message_queue`.
+    """
+    if url and url.startswith('sqlite:'):
+        return SQLiteQueueManager(url, channel=channel, write_only=write_only)
+    return None
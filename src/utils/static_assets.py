@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import threading
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Only gzip variants are built
+
+MANIFEST_NAME = 'manifest.json'
+# Files whose URL carries a content hash, so browsers may cache them forever
+FINGERPRINTED = {'.js', '.css'}
+COMPRESSIBLE = {'.html', '.js', '.css', '.json', '.svg', '.txt', '.ico'}
+MIN_COMPRESS_SIZE = 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# src="..." and href="..." pointing at a local file
+REFERENCE_RE = re.compile(r'''((?:src|href)=["'])([^"'#?:]+)(["'])''')
+
+def _fingerprinted_name(name, content):
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+def _write_variants(path, content):
+    """Write the file and its smaller precompressed variants; returns the encodings written"""
+    with open(path, 'wb') as out:
+        out.write(content)
+    if os.path.splitext(path)[1] not in COMPRESSIBLE or len(content) < MIN_COMPRESS_SIZE:
+        return []
+
+    variants = [('gzip', '.gz', gzip.compress(content, 9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ('br', '.br', brotli.compress(content, quality=11)))
+    encodings = []
+    for encoding, suffix, compressed in variants:
+        if len(compressed) < len(content):
+            with open(path + suffix, 'wb') as out:
+                out.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+def build_assets(static_folder, build_folder):
+    """Fingerprint, rewrite and precompress static_folder into build_folder
+
+    JS and CSS files get their content hash in the name and references to
+    them in HTML are rewritten. Returns the manifest, which maps each URL
+    path to its built file, its encodings and whether it is immutable.
+    """
+    sources = {}
+    for root, dirs, files in os.walk(static_folder):
+        for name in files:
+            path = os.path.join(root, name)
+            sources[os.path.relpath(path, static_folder).replace(os.sep, '/')] = path
+
+    contents = {}
+    renamed = {}
+    for name, path in sources.items():
+        with open(path, 'rb') as source:
+            contents[name] = source.read()
+        if os.path.splitext(name)[1] in FINGERPRINTED:
+            renamed[name] = _fingerprinted_name(name, contents[name])
+
+    def rewrite(match):
+        return match.group(1) + renamed.get(match.group(2), match.group(2)) + match.group(3)
+
+    if os.path.exists(build_folder):
+        shutil.rmtree(build_folder)
+    files = {}
+    for name in sorted(contents):
+        content = contents[name]
+        if name.endswith('.html'):
+            content = REFERENCE_RE.sub(rewrite, content.decode('utf-8')).encode('utf-8')
+        built = renamed.get(name, name)
+        path = os.path.join(build_folder, built)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {'file': built, 'encodings': _write_variants(path, content)}
+        files[built] = dict(entry, immutable=name in renamed)
+        if name in renamed:
+            # The plain name still works for old pages, but must be revalidated
+            files[name] = dict(entry, immutable=False)
+
+    manifest = {'files': files}
+    with open(os.path.join(build_folder, MANIFEST_NAME), 'w') as out:
+        json.dump(manifest, out, indent=2, sort_keys=True)
+    return manifest
+
+class StaticAssets:
+    """In-memory index of the files serve() may return
+
+    Loaded once per process from the build manifest, or from a scan of
+    the static folder when no build exists, so requests never touch the
+    filesystem to decide what to serve. Built files are sent in the best
+    precompressed encoding the client accepts.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._files = None
+        self._root = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+
+    def _load(self):
+        build_folder = self.app.config['ASSET_BUILD_FOLDER']
+        manifest_path = os.path.join(build_folder, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as source:
+                return build_folder, json.load(source)['files']
+
+        # No build: serve the sources as they are, always revalidated
+        files = {}
+        static_folder = self.app.static_folder
+        for root, dirs, names in os.walk(static_folder):
+            for name in names:
+                relative = os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/')
+                files[relative] = {'file': relative, 'encodings': [], 'immutable': False}
+        return static_folder, files
+
+    def lookup(self, path):
+        """The manifest entry for a URL path, or None"""
+        if self._files is None:
+            with self._lock:
+                if self._files is None:
+                    self._root, self._files = self._load()
+        return self._files.get(path)
+
+    def send(self, entry):
+        path = os.path.join(self._root, entry['file'])
+        encoding = next((e for e in entry['encodings'] if request.accept_encodings[e]), None)
+        response = send_file(
+            path + {'br': '.br', 'gzip': '.gz'}[encoding] if encoding else path,
+            mimetype=mimetypes.guess_type(entry['file'])[0] or 'application/octet-stream',
+            conditional=True,
+            max_age=IMMUTABLE_MAX_AGE if entry['immutable'] else None
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry['encodings']:
+            response.vary.add('Accept-Encoding')
+        if entry['immutable']:
+            response.cache_control.immutable = True
+        return response
+
+static_assets = StaticAssets()
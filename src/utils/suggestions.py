@@ -0,0 +1,276 @@
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from src.models.user import FAQ, Ticket
+from src.utils.fulltext import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Tickets in these states are candidates for duplicate detection
+OPEN_STATUSES = ('open', 'in_progress')
+RECENT_DAYS = 90
+# Other workers' writes only reach this process's index on a rebuild
+REBUILD_INTERVAL = 600
+MIN_SCORE = 0.1
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'can', 'do', 'for', 'from', 'have',
+    'how', 'i', 'if', 'in', 'is', 'it', 'my', 'no', 'not', 'of', 'on', 'or', 'so', 'that', 'the',
+    'this', 'to', 'was', 'what', 'when', 'where', 'which', 'with', 'you', 'your', 'me', 'am', 'we'
+}
+
+def terms(*texts):
+    """Term frequencies of the given texts, minus stopwords"""
+    return Counter(
+        token for text in texts for token in tokenize(text)
+        if token not in STOPWORDS and len(token) > 1
+    )
+
+class TfIdfIndex:
+    """Sparse TF-IDF vectors with an inverted index, updated one document at a time"""
+
+    def __init__(self):
+        self.docs = {}  # doc id -> (term frequencies, payload)
+        self.postings = {}  # term -> set of doc ids
+        self.df = Counter()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id, tf, payload):
+        self.remove(doc_id)
+        if not tf:
+            return
+        self.docs[doc_id] = (tf, payload)
+        for term in tf:
+            self.postings.setdefault(term, set()).add(doc_id)
+            self.df[term] += 1
+
+    def remove(self, doc_id):
+        entry = self.docs.pop(doc_id, None)
+        if entry is None:
+            return
+        for term in entry[0]:
+            self.postings[term].discard(doc_id)
+            self.df[term] -= 1
+            if not self.df[term]:
+                del self.df[term]
+                del self.postings[term]
+
+    def _idf(self, term):
+        return math.log((1 + len(self.docs)) / (1 + self.df.get(term, 0))) + 1
+
+    def _weights(self, tf):
+        return {term: (1 + math.log(count)) * self._idf(term) for term, count in tf.items()}
+
+    def top_k(self, tf, k, accept=None):
+        """(cosine score, payload) of the k documents closest to `tf`"""
+        query = self._weights(tf)
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+        if not query_norm:
+            return []
+
+        candidates = set()
+        for term in query:
+            candidates.update(self.postings.get(term, ()))
+
+        scored = []
+        for doc_id in candidates:
+            doc_tf, payload = self.docs[doc_id]
+            if accept is not None and not accept(payload):
+                continue
+            doc = self._weights(doc_tf)
+            dot = sum(weight * doc[term] for term, weight in query.items() if term in doc)
+            norm = math.sqrt(sum(w * w for w in doc.values()))
+            scored.append((dot / (query_norm * norm), payload))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [item for item in scored[:k] if item[0] >= MIN_SCORE]
+
+class SuggestionEngine:
+    """Per-process TF-IDF indexes over active FAQs and recent open tickets by department
+
+    The first request builds the indexes; after that they are rebuilt in a
+    background thread every REBUILD_INTERVAL while requests keep using the
+    current ones. Changes committed while a build runs are replayed onto
+    the new indexes before they replace the old.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # Guards the indexes; never held while building
+        self._build_lock = threading.RLock()  # One build at a time
+        self.faqs = None
+        self.tickets = {}  # department id -> TfIdfIndex
+        self._built_at = 0
+        self._pending = None  # Changes committed during a build, else None
+        self._rebuilding = False
+
+    def _build(self):
+        faqs = TfIdfIndex()
+        for faq in FAQ.query.filter_by(is_active=True).all():
+            faqs.add(faq.id, terms(faq.question, faq.answer), _faq_payload(faq))
+
+        tickets = {}
+        since = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+        recent = Ticket.query.filter(Ticket.status.in_(OPEN_STATUSES), Ticket.created_at >= since)
+        for ticket in recent.all():
+            index = tickets.setdefault(ticket.department_id, TfIdfIndex())
+            index.add(ticket.id, terms(ticket.title, ticket.description), _ticket_payload(ticket))
+        return faqs, tickets
+
+    def rebuild(self):
+        """Build fresh indexes from the database and swap them in"""
+        with self._build_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                faqs, tickets = self._build()
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                self.faqs, self.tickets = faqs, tickets
+                pending, self._pending = self._pending, None
+                self._apply(pending)
+                self._built_at = time.monotonic()
+
+    def _rebuild_in_background(self, app):
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception:
+            logger.exception('Suggestion index rebuild failed')
+        finally:
+            self._rebuilding = False
+
+    def _ensure_built(self):
+        if self.faqs is None:
+            with self._build_lock:
+                if self.faqs is None:
+                    self.rebuild()
+            return
+        with self._lock:
+            if self._rebuilding or time.monotonic() - self._built_at < REBUILD_INTERVAL:
+                return
+            self._rebuilding = True
+        # Other workers' writes only arrive through a rebuild; keep serving meanwhile
+        threading.Thread(
+            target=self._rebuild_in_background,
+            args=(current_app._get_current_object(),),
+            name='suggestion-rebuild',
+            daemon=True
+        ).start()
+
+    def suggest(self, text, department_id=None, student_id=None, k=5):
+        """Top-k similar FAQs and open tickets for the text being typed
+
+        Tickets come from `department_id` only, and only the student's own
+        when `student_id` is given; callers scope both to what the user may see.
+        """
+        tf = terms(text)
+        self._ensure_built()
+        with self._lock:
+            faqs = self.faqs.top_k(tf, k)
+            tickets = []
+            if department_id is not None and department_id in self.tickets:
+                accept = (lambda p: p['student_id'] == student_id) if student_id is not None else None
+                tickets = self.tickets[department_id].top_k(tf, k, accept)
+
+        return {
+            'faqs': [dict(payload, score=round(score, 3)) for score, payload in faqs],
+            'tickets': [
+                {key: value for key, value in dict(payload, score=round(score, 3)).items() if key != 'student_id'}
+                for score, payload in tickets
+            ]
+        }
+
+    def apply(self, changes):
+        """Fold committed FAQ/ticket snapshots into the built indexes"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend(changes)  # Replayed onto the indexes being built
+            if self.faqs is not None:
+                self._apply(changes)
+
+    def _apply(self, changes):
+        for kind, snapshot in changes:
+            if kind == 'faq':
+                if snapshot['is_active']:
+                    self.faqs.add(snapshot['id'], terms(snapshot['question'], snapshot['answer']), snapshot['payload'])
+                else:
+                    self.faqs.remove(snapshot['id'])
+            elif kind == 'faq_deleted':
+                self.faqs.remove(snapshot['id'])
+            else:
+                for index in self.tickets.values():
+                    index.remove(snapshot['id'])
+                if kind == 'ticket' and snapshot['status'] in OPEN_STATUSES:
+                    index = self.tickets.setdefault(snapshot['department_id'], TfIdfIndex())
+                    index.add(snapshot['id'], terms(snapshot['title'], snapshot['description']), snapshot['payload'])
+
+def _faq_payload(faq):
+    return {'id': faq.id, 'question': faq.question, 'category_id': faq.category_id}
+
+def _ticket_payload(ticket):
+    return {
+        'id': ticket.id,
+        'ticket_id': ticket.ticket_id,
+        'title': ticket.title,
+        'status': ticket.status,
+        'student_id': ticket.student_id
+    }
+
+suggestion_engine = SuggestionEngine()
+
+def _record(target, change):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('suggestion_changes', []).append(change)
+
+@event.listens_for(FAQ, 'after_insert')
+@event.listens_for(FAQ, 'after_update')
+def _record_faq(mapper, connection, faq):
+    _record(faq, ('faq', {
+        'id': faq.id,
+        'is_active': faq.is_active,
+        'question': faq.question,
+        'answer': faq.answer,
+        'payload': _faq_payload(faq)
+    }))
+
+@event.listens_for(FAQ, 'after_delete')
+def _record_faq_delete(mapper, connection, faq):
+    _record(faq, ('faq_deleted', {'id': faq.id}))
+
+@event.listens_for(Ticket, 'after_insert')
+@event.listens_for(Ticket, 'after_update')
+def _record_ticket(mapper, connection, ticket):
+    _record(ticket, ('ticket', {
+        'id': ticket.id,
+        'status': ticket.status,
+        'department_id': ticket.department_id,
+        'title': ticket.title,
+        'description': ticket.description,
+        'payload': _ticket_payload(ticket)
+    }))
+
+@event.listens_for(Ticket, 'after_delete')
+def _record_ticket_delete(mapper, connection, ticket):
+    _record(ticket, ('ticket_deleted', {'id': ticket.id}))
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed(session):
+    changes = session.info.pop('suggestion_changes', None)
+    if changes:
+        suggestion_engine.apply(changes)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('suggestion_changes', None)
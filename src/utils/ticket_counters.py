@@ -0,0 +1,147 @@
+from sqlalchemy import func, case, insert, select, update
+from src.models.user import db, Ticket, TicketCounter
+
+def lock_ticket(ticket_id):
+    """Load a ticket locked until the transaction ends, so counter_key() of it stays true
+
+    Without the lock, two concurrent status or priority changes would both
+    read the same old key and move the ticket out of that bucket twice.
+    """
+    query = Ticket.query.filter_by(id=ticket_id).populate_existing()
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # No row locks on SQLite: a no-op UPDATE takes the write lock before the read
+        db.session.execute(
+            update(Ticket).where(Ticket.id == ticket_id).values(id=Ticket.id)
+            .execution_options(synchronize_session=False)
+        )
+        return query.first()
+    return query.with_for_update().first()
+
+def counter_key(ticket):
+    """Snapshot of the ticket fields the counters are keyed and summed on"""
+    rating = ticket.satisfaction_rating if ticket.status == 'resolved' else None
+    return (ticket.department_id, ticket.status, ticket.priority, rating)
+
+def _dialect_insert():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+def _add(department_id, status, priority, count, rating):
+    """Add a delta to one counter row, creating it if needed"""
+    values = {
+        'department_id': department_id,
+        'status': status,
+        'priority': priority,
+        'ticket_count': count,
+        'rating_sum': count * rating if rating is not None else 0,
+        'rating_count': count if rating is not None else 0
+    }
+    dialect_insert = _dialect_insert()
+    if dialect_insert is None:
+        counter = db.session.get(TicketCounter, (department_id, status, priority))
+        if counter is None:
+            db.session.add(TicketCounter(**values))
+        else:
+            counter.ticket_count += values['ticket_count']
+            counter.rating_sum += values['rating_sum']
+            counter.rating_count += values['rating_count']
+        return
+
+    stmt = dialect_insert(TicketCounter).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['department_id', 'status', 'priority'],
+        set_={
+            'ticket_count': TicketCounter.ticket_count + stmt.excluded.ticket_count,
+            'rating_sum': TicketCounter.rating_sum + stmt.excluded.rating_sum,
+            'rating_count': TicketCounter.rating_count + stmt.excluded.rating_count
+        }
+    )
+    db.session.execute(stmt)
+
+def apply_counter_change(before, after):
+    """Move a ticket between counter rows; call before the handler commits
+
+    `before`/`after` are counter_key() snapshots, or None for a ticket
+    that did not exist yet / no longer exists. `before` must be taken from
+    a ticket loaded with lock_ticket().
+    """
+    if before == after:
+        return
+    if before is not None:
+        _add(*before[:3], -1, before[3])
+    if after is not None:
+        _add(*after[:3], 1, after[3])
+
+def counters_query(department_id=None):
+    """Status x priority rows from the rollup, shaped like ticket_stats.stats_query()"""
+    query = db.session.query(
+        TicketCounter.status,
+        TicketCounter.priority,
+        func.sum(TicketCounter.ticket_count).label('ticket_count'),
+        func.sum(TicketCounter.rating_sum).label('rating_sum'),
+        func.sum(TicketCounter.rating_count).label('rating_count')
+    )
+    if department_id is not None:
+        query = query.filter(TicketCounter.department_id == department_id)
+    return query.group_by(TicketCounter.status, TicketCounter.priority)
+
+def _live_counts():
+    """Counter rows recomputed from the tickets table"""
+    rated = case(
+        (Ticket.status == 'resolved', Ticket.satisfaction_rating),
+        else_=None
+    )
+    return select(
+        Ticket.department_id,
+        Ticket.status,
+        Ticket.priority,
+        func.count().label('ticket_count'),
+        func.coalesce(func.sum(rated), 0).label('rating_sum'),
+        func.count(rated).label('rating_count')
+    ).group_by(Ticket.department_id, Ticket.status, Ticket.priority)
+
+def rebuild_ticket_counters():
+    """Recompute the rollup from scratch in one transaction"""
+    db.session.query(TicketCounter).delete()
+    db.session.execute(
+        insert(TicketCounter).from_select(
+            ['department_id', 'status', 'priority', 'ticket_count', 'rating_sum', 'rating_count'],
+            _live_counts()
+        )
+    )
+    db.session.commit()
+
+def verify_ticket_counters():
+    """Return the counter rows that disagree with the live tickets table"""
+    live = {
+        (row.department_id, row.status, row.priority): (row.ticket_count, row.rating_sum, row.rating_count)
+        for row in db.session.execute(_live_counts())
+    }
+    stored = {
+        (c.department_id, c.status, c.priority): (c.ticket_count, c.rating_sum, c.rating_count)
+        for c in TicketCounter.query.all()
+        if c.ticket_count or c.rating_sum or c.rating_count
+    }
+
+    mismatches = []
+    for key in sorted(set(live) | set(stored), key=str):
+        if live.get(key) != stored.get(key):
+            mismatches.append({
+                'department_id': key[0],
+                'status': key[1],
+                'priority': key[2],
+                'expected': live.get(key),
+                'stored': stored.get(key)
+            })
+    return mismatches
+
+def ensure_ticket_counters():
+    """Build the rollup once for databases that had tickets before it existed"""
+    if TicketCounter.query.first() is None and Ticket.query.first() is not None:
+        rebuild_ticket_counters()
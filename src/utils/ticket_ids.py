@@ -0,0 +1,119 @@
+import os
+import threading
+from flask import current_app
+from sqlalchemy import func, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db, Ticket, IdCounter
+
+DEFAULT_PREFIX = 'TKT'
+DEFAULT_WIDTH = 6
+DEFAULT_BLOCK_SIZE = 20
+
+SEQUENCE_NAME = 'ticket_number_seq'
+COUNTER_NAME = 'ticket_number'
+
+class TicketIdAllocator:
+    """Hands out ticket numbers from blocks reserved in the database
+
+    Each process reserves `block_size` numbers at a time with a single
+    nextval() (Postgres) or UPDATE ... RETURNING on id_counters (SQLite),
+    committed on its own connection, so numbers are never reused and no
+    request ever has to check for or retry on a collision. The sequence
+    and counter row are created by ensure_ticket_ids(), never by a request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}  # engine url -> (pid, next number, end of block)
+        self._ready = {}  # engine url -> block size shared through the sequence
+
+    def next_number(self, engine, block_size):
+        key = str(engine.url)
+        with self._lock:
+            pid, current, end = self._blocks.get(key, (None, 0, 0))
+            # A forked worker must not reuse the parent's block
+            if pid != os.getpid() or current >= end:
+                current, end = self._reserve(engine, key, block_size)
+            self._blocks[key] = (os.getpid(), current + 1, end)
+            return current
+
+    def _reserve(self, engine, key, block_size):
+        postgres = engine.dialect.name == 'postgresql'
+        if postgres and key not in self._ready:
+            # The sequence increment is the block size every process must share
+            with engine.connect() as conn:
+                increment = _sequence_increment(conn)
+            if increment is None:
+                raise RuntimeError(f'Sequence {SEQUENCE_NAME} is missing; run init_db first')
+            self._ready[key] = increment
+        block_size = self._ready.get(key, block_size)
+
+        with engine.begin() as conn:
+            if postgres:
+                start = conn.execute(text(f"SELECT nextval('{SEQUENCE_NAME}')")).scalar()
+            else:
+                end = conn.execute(
+                    update(IdCounter)
+                    .where(IdCounter.name == COUNTER_NAME)
+                    .values(next_value=IdCounter.next_value + block_size)
+                    .returning(IdCounter.next_value)
+                ).scalar()
+                if end is None:
+                    raise RuntimeError(f'Counter {COUNTER_NAME} is missing; run init_db first')
+                start = end - block_size
+        return start, start + block_size
+
+    def reset(self):
+        """Forget reserved blocks (unused numbers in them are skipped)"""
+        with self._lock:
+            self._blocks.clear()
+            self._ready.clear()
+
+def _first_free_number(conn):
+    """One past the highest numeric ticket ID already issued"""
+    prefix = _config('TICKET_ID_PREFIX', DEFAULT_PREFIX)
+    latest = conn.execute(
+        db.select(Ticket.ticket_id)
+        .where(Ticket.ticket_id.like(f'{prefix}%'))
+        .order_by(func.length(Ticket.ticket_id).desc(), Ticket.ticket_id.desc())
+        .limit(1)
+    ).scalar()
+    if latest and latest[len(prefix):].isdigit():
+        return int(latest[len(prefix):]) + 1
+    return 1
+
+def _sequence_increment(conn):
+    return conn.execute(
+        text('SELECT increment_by FROM pg_sequences WHERE sequencename = :name'),
+        {'name': SEQUENCE_NAME}
+    ).scalar()
+
+def _config(name, default):
+    return current_app.config.get(name, default)
+
+allocator = TicketIdAllocator()
+
+def ensure_ticket_ids():
+    """Create the ticket number sequence (Postgres) or counter row (SQLite), starting after existing IDs"""
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            if conn.execute(text(f"SELECT to_regclass('{SEQUENCE_NAME}')")).scalar() is None:
+                block_size = int(_config('TICKET_ID_BLOCK_SIZE', DEFAULT_BLOCK_SIZE))
+                conn.execute(text(
+                    f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE_NAME} '
+                    f'INCREMENT BY {block_size} START WITH {_first_free_number(conn)}'
+                ))
+        elif conn.execute(db.select(IdCounter.name).where(IdCounter.name == COUNTER_NAME)).first() is None:
+            conn.execute(
+                sqlite_insert(IdCounter)
+                .values(name=COUNTER_NAME, next_value=_first_free_number(conn))
+                .on_conflict_do_nothing()
+            )
+
+def next_ticket_id():
+    """Allocate the next human-readable ticket ID, e.g. TKT000123"""
+    prefix = _config('TICKET_ID_PREFIX', DEFAULT_PREFIX)
+    width = _config('TICKET_ID_WIDTH', DEFAULT_WIDTH)
+    block_size = _config('TICKET_ID_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+    number = allocator.next_number(db.engine, block_size)
+    return f'{prefix}{number:0{width}d}'
@@ -0,0 +1,61 @@
+from datetime import datetime
+from sqlalchemy import and_, case, func
+from sqlalchemy.dialects.postgresql import insert as postgres_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db, Ticket, TicketRead
+
+# The unread count only looks at this many of the most recently changed tickets in scope
+UNREAD_WINDOW = 200
+
+def mark_ticket_read(conn, user_id, ticket_id, seq):
+    """Record that the user has seen the ticket up to change `seq`; never moves backwards"""
+    if not seq:
+        return
+    dialect_insert = {'postgresql': postgres_insert, 'sqlite': sqlite_insert}.get(conn.dialect.name)
+    if dialect_insert is None:
+        updated = conn.execute(
+            db.update(TicketRead)
+            .where(TicketRead.user_id == user_id, TicketRead.ticket_id == ticket_id, TicketRead.last_read_seq < seq)
+            .values(last_read_seq=seq, read_at=datetime.utcnow())
+        ).rowcount
+        exists = updated or conn.execute(
+            db.select(TicketRead.user_id).where(TicketRead.user_id == user_id, TicketRead.ticket_id == ticket_id)
+        ).first()
+        if not exists:
+            conn.execute(db.insert(TicketRead).values(
+                user_id=user_id, ticket_id=ticket_id, last_read_seq=seq, read_at=datetime.utcnow()
+            ))
+        return
+
+    stmt = dialect_insert(TicketRead).values(
+        user_id=user_id, ticket_id=ticket_id, last_read_seq=seq, read_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'ticket_id'],
+        set_={
+            'last_read_seq': case(
+                (stmt.excluded.last_read_seq > TicketRead.last_read_seq, stmt.excluded.last_read_seq),
+                else_=TicketRead.last_read_seq
+            ),
+            'read_at': stmt.excluded.read_at
+        }
+    )
+    conn.execute(stmt)
+
+def unread_count(query, user_id, window=UNREAD_WINDOW):
+    """Query counting unread tickets among the `window` most recently changed ones of a ticket query
+
+    Reads at most `window` rows from the scope's change_seq index and as
+    many ticket_reads rows, however many tickets the scope holds; older
+    unread tickets are left out of the badge.
+    """
+    recent = (
+        query.with_entities(Ticket.id, Ticket.change_seq)
+        .order_by(None)
+        .order_by(Ticket.change_seq.desc())
+        .limit(window)
+        .subquery()
+    )
+    return db.session.query(func.count()).select_from(recent).outerjoin(
+        TicketRead, and_(TicketRead.ticket_id == recent.c.id, TicketRead.user_id == user_id)
+    ).filter(recent.c.change_seq > func.coalesce(TicketRead.last_read_seq, 0))
@@ -0,0 +1,250 @@
+from sqlalchemy import event, inspect, text
+from src.models.user import db, Ticket, TicketResponse
+from src.utils.fulltext import TS_CONFIG, tokenize, fts5_query, ts_query, fts5_available, sqlite_table_exists
+from src.utils.serialization import with_ticket_relations
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# A hit in the thread counts for less than a hit in the ticket itself
+RESPONSE_WEIGHT = 0.5
+
+TICKET_FTS = 'ticket_search'
+RESPONSE_FTS = 'ticket_response_search'
+
+def _scope_clause(auth, params):
+    """Same visibility rules as get_my_tickets"""
+    if auth.role == 'student':
+        params['scope_id'] = auth.id
+        return 'tickets.student_id = :scope_id'
+    if auth.role == 'staff':
+        params['scope_id'] = auth.department_id
+        return 'tickets.department_id = :scope_id'
+    return '1 = 1'
+
+# Restricts the matches to the student's own tickets before they are ranked,
+# so a student's search never walks everyone else's hits
+STUDENT_TICKETS = 'SELECT id FROM tickets WHERE student_id = :scope_id'
+
+def _ranked_tickets(matches_sql, auth, status, limit, params):
+    """The statement ranking `matches_sql` hits among the tickets `auth` may see"""
+    params['limit'] = limit
+    sql = (
+        f"SELECT tickets.id, max(matches.relevance) AS relevance FROM ({matches_sql}) AS matches "
+        "JOIN tickets ON tickets.id = matches.ticket_id "
+        f"WHERE {_scope_clause(auth, params)}"
+    )
+    if status:
+        sql += ' AND tickets.status = :status'
+        params['status'] = status
+    sql += ' GROUP BY tickets.id ORDER BY relevance DESC LIMIT :limit'
+    return text(sql).bindparams(**params)
+
+class SQLiteTicketSearch:
+    """FTS5 tables for tickets (rowid = tickets.id) and responses (rowid = ticket_responses.id)"""
+
+    def ensure_index(self, conn):
+        if not sqlite_table_exists(conn, TICKET_FTS):
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {TICKET_FTS} USING fts5("
+                "title, description, tokenize = 'porter unicode61')"
+            ))
+            conn.execute(text(
+                f"INSERT INTO {TICKET_FTS} (rowid, title, description) "
+                "SELECT id, title, description FROM tickets"
+            ))
+        if not sqlite_table_exists(conn, RESPONSE_FTS):
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {RESPONSE_FTS} USING fts5("
+                "message, tokenize = 'porter unicode61')"
+            ))
+            conn.execute(text(
+                f"INSERT INTO {RESPONSE_FTS} (rowid, message) SELECT id, message FROM ticket_responses"
+            ))
+
+    def sync_ticket(self, conn, ticket):
+        conn.execute(text(f'DELETE FROM {TICKET_FTS} WHERE rowid = :id'), {'id': ticket.id})
+        conn.execute(
+            text(f'INSERT INTO {TICKET_FTS} (rowid, title, description) VALUES (:id, :title, :description)'),
+            {'id': ticket.id, 'title': ticket.title, 'description': ticket.description}
+        )
+
+    def remove_ticket(self, conn, ticket_id):
+        conn.execute(text(f'DELETE FROM {TICKET_FTS} WHERE rowid = :id'), {'id': ticket_id})
+
+    def sync_response(self, conn, response):
+        conn.execute(text(f'DELETE FROM {RESPONSE_FTS} WHERE rowid = :id'), {'id': response.id})
+        conn.execute(
+            text(f'INSERT INTO {RESPONSE_FTS} (rowid, message) VALUES (:id, :message)'),
+            {'id': response.id, 'message': response.message}
+        )
+
+    def remove_response(self, conn, response_id):
+        conn.execute(text(f'DELETE FROM {RESPONSE_FTS} WHERE rowid = :id'), {'id': response_id})
+
+    def search_statement(self, tokens, auth, status, limit):
+        ticket_filter = response_filter = ''
+        if auth.role == 'student':
+            # rowid IN (...) lets FTS5 look up only these rows instead of every match
+            ticket_filter = f' AND rowid IN ({STUDENT_TICKETS})'
+            response_filter = (
+                f' AND {RESPONSE_FTS}.rowid IN (SELECT ticket_responses.id FROM ticket_responses '
+                f'WHERE ticket_responses.ticket_id IN ({STUDENT_TICKETS}))'
+                ' AND NOT coalesce(ticket_responses.is_internal, 0)'
+            )
+        matches_sql = (
+            f"SELECT rowid AS ticket_id, -bm25({TICKET_FTS}, 2.0, 1.0) AS relevance "
+            f"FROM {TICKET_FTS} WHERE {TICKET_FTS} MATCH :query{ticket_filter} "
+            "UNION ALL "
+            f"SELECT ticket_responses.ticket_id, -bm25({RESPONSE_FTS}) * {RESPONSE_WEIGHT} "
+            f"FROM {RESPONSE_FTS} JOIN ticket_responses ON ticket_responses.id = {RESPONSE_FTS}.rowid "
+            f"WHERE {RESPONSE_FTS} MATCH :query{response_filter}"
+        )
+        return _ranked_tickets(matches_sql, auth, status, limit, {'query': fts5_query(tokens)})
+
+class PostgresTicketSearch:
+    """tsvector generated columns with GIN indexes on tickets and ticket_responses"""
+
+    def ensure_index(self, conn):
+        conn.execute(text(
+            "ALTER TABLE tickets ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS (setweight(to_tsvector('{TS_CONFIG}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{TS_CONFIG}', coalesce(description, '')), 'B')) STORED"
+        ))
+        conn.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_tickets_search_vector ON tickets USING GIN (search_vector)'
+        ))
+        conn.execute(text(
+            "ALTER TABLE ticket_responses ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{TS_CONFIG}', coalesce(message, ''))) STORED"
+        ))
+        conn.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_ticket_responses_search_vector '
+            'ON ticket_responses USING GIN (search_vector)'
+        ))
+
+    def sync_ticket(self, conn, ticket):
+        pass  # Generated columns follow every insert and update
+
+    def remove_ticket(self, conn, ticket_id):
+        pass
+
+    def sync_response(self, conn, response):
+        pass
+
+    def remove_response(self, conn, response_id):
+        pass
+
+    def search_statement(self, tokens, auth, status, limit):
+        ticket_filter = response_filter = ''
+        if auth.role == 'student':
+            ticket_filter = ' AND tickets.student_id = :scope_id'
+            response_filter = (
+                f' AND ticket_responses.ticket_id IN ({STUDENT_TICKETS})'
+                ' AND NOT coalesce(ticket_responses.is_internal, false)'
+            )
+        matches_sql = (
+            "SELECT tickets.id AS ticket_id, ts_rank_cd(tickets.search_vector, query) AS relevance "
+            f"FROM tickets, to_tsquery('{TS_CONFIG}', :query) AS query "
+            f"WHERE tickets.search_vector @@ query{ticket_filter} "
+            "UNION ALL "
+            f"SELECT ticket_responses.ticket_id, ts_rank_cd(ticket_responses.search_vector, query) * {RESPONSE_WEIGHT} "
+            f"FROM ticket_responses, to_tsquery('{TS_CONFIG}', :query) AS query "
+            f"WHERE ticket_responses.search_vector @@ query{response_filter}"
+        )
+        return _ranked_tickets(matches_sql, auth, status, limit, {'query': ts_query(tokens)})
+
+_backends = {}  # engine url -> backend once its index exists
+
+def ensure_ticket_search_index():
+    """Create (and on SQLite, backfill) the ticket search indexes if missing"""
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            backend = PostgresTicketSearch()
+        elif conn.dialect.name == 'sqlite' and fts5_available(conn):
+            backend = SQLiteTicketSearch()
+        else:
+            return None  # No full-text support on this database
+        backend.ensure_index(conn)
+    _backends[str(db.engine.url)] = backend
+    return backend
+
+def search_tickets(query, auth, status=None, limit=DEFAULT_LIMIT):
+    """Tickets visible to `auth` whose title, description or thread match `query`
+
+    Students only ever match their own tickets and never internal notes.
+    The last query token matches as a prefix.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    backend = _backends.get(str(db.engine.url)) or ensure_ticket_search_index()
+    if backend is None:
+        raise RuntimeError(f'Ticket search is not supported on {db.engine.dialect.name}')
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    rows = db.session.execute(backend.search_statement(tokens, auth, status, limit)).fetchall()
+    relevance = {row[0]: float(row[1] or 0) for row in rows}
+    if not relevance:
+        return []
+
+    tickets = with_ticket_relations(Ticket.query).filter(Ticket.id.in_(list(relevance))).all()
+    tickets.sort(key=lambda ticket: relevance[ticket.id], reverse=True)
+    return tickets
+
+def _backend(connection):
+    """The backend whose indexes already exist on this connection's database
+
+    Found from the dialect and the schema, never by creating anything, so
+    a worker that never ran ensure_ticket_search_index() still keeps the
+    indexes in step with its writes.
+    """
+    key = str(connection.engine.url)
+    backend = _backends.get(key)
+    if backend is None:
+        if connection.dialect.name == 'postgresql':
+            backend = PostgresTicketSearch()
+        elif connection.dialect.name == 'sqlite' and sqlite_table_exists(connection, TICKET_FTS):
+            backend = SQLiteTicketSearch()
+        else:
+            return None  # Nothing to keep in step until the indexes are created
+        _backends[key] = backend
+    return backend
+
+@event.listens_for(Ticket, 'after_insert')
+def _index_ticket(mapper, connection, ticket):
+    backend = _backend(connection)
+    if backend is not None:
+        backend.sync_ticket(connection, ticket)
+
+@event.listens_for(Ticket, 'after_update')
+def _reindex_ticket(mapper, connection, ticket):
+    backend = _backend(connection)
+    state = inspect(ticket)
+    if backend is not None and (
+        state.attrs.title.history.has_changes() or state.attrs.description.history.has_changes()
+    ):
+        backend.sync_ticket(connection, ticket)
+
+@event.listens_for(Ticket, 'after_delete')
+def _unindex_ticket(mapper, connection, ticket):
+    backend = _backend(connection)
+    if backend is not None:
+        backend.remove_ticket(connection, ticket.id)
+
+@event.listens_for(TicketResponse, 'after_insert')
+def _index_response(mapper, connection, response):
+    backend = _backend(connection)
+    if backend is not None:
+        backend.sync_response(connection, response)
+
+@event.listens_for(TicketResponse, 'after_update')
+def _reindex_response(mapper, connection, response):
+    backend = _backend(connection)
+    if backend is not None and inspect(response).attrs.message.history.has_changes():
+        backend.sync_response(connection, response)
+
+@event.listens_for(TicketResponse, 'after_delete')
+def _unindex_response(mapper, connection, response):
+    backend = _backend(connection)
+    if backend is not None:
+        backend.remove_response(connection, response.id)
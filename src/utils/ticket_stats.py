@@ -0,0 +1,114 @@
+from sqlalchemy import func, case
+from src.models.user import db, Ticket
+from src.utils.ticket_counters import counters_query
+
+STATUSES = ('open', 'in_progress', 'resolved', 'closed')
+PRIORITIES = ('low', 'medium', 'high', 'urgent')
+
+# Optional breakdown dimensions accepted by /api/tickets/stats?group_by=
+DIMENSIONS = {
+    'category': Ticket.category_id,
+    'assignee': Ticket.assigned_to,
+}
+# (SQLite strftime format, Postgres to_char format)
+TIME_BUCKETS = {
+    'day': ('%Y-%m-%d', 'YYYY-MM-DD'),
+    'week': ('%Y-W%W', 'IYYY-"W"IW'),
+    'month': ('%Y-%m', 'YYYY-MM'),
+}
+
+# Scope of staff without a department: like visible_tickets, they see no tickets
+NO_DEPARTMENT = object()
+
+def stats_scope(user):
+    """department_id for the user's stats; only admins get None, the whole institution"""
+    if user.role == 'admin':
+        return None
+    return user.department_id if user.department_id is not None else NO_DEPARTMENT
+
+def _bucket_column(bucket):
+    """created_at truncated to a bucket, rendered as a string key"""
+    sqlite_format, pg_format = TIME_BUCKETS[bucket]
+    if db.engine.dialect.name == 'postgresql':
+        return func.to_char(Ticket.created_at, pg_format)
+    return func.strftime(sqlite_format, Ticket.created_at)
+
+def _empty_counts():
+    counts = {'total': 0}
+    counts.update({status: 0 for status in STATUSES})
+    return counts
+
+def stats_query(department_id=None, dimensions=(), bucket=None):
+    """One GROUP BY over status, priority and any requested dimensions"""
+    rated = case(
+        (Ticket.status == 'resolved', Ticket.satisfaction_rating),
+        else_=None
+    )
+    group_columns = [Ticket.status, Ticket.priority]
+    group_columns += [DIMENSIONS[name] for name in dimensions]
+    if bucket:
+        group_columns.append(_bucket_column(bucket).label('bucket'))
+
+    query = db.session.query(
+        *group_columns,
+        func.count().label('ticket_count'),
+        func.sum(rated).label('rating_sum'),
+        func.count(rated).label('rating_count')
+    )
+    if department_id is not None:
+        query = query.filter(Ticket.department_id == department_id)
+    return query.group_by(*group_columns)
+
+def aggregate_ticket_stats(department_id=None, dimensions=(), bucket=None):
+    """Ticket counts by status/priority and average rating in one round-trip
+
+    Scoped to a department when department_id is given, and empty for
+    NO_DEPARTMENT. Plain status and
+    priority stats are read from the ticket_counters rollup; each requested
+    dimension ('category', 'assignee') and the optional created-at bucket
+    ('day', 'week', 'month') falls back to grouping the tickets table and
+    adds a by_<name> breakdown of status counts.
+    """
+    for name in dimensions:
+        if name not in DIMENSIONS:
+            raise ValueError(f'Unknown stats dimension: {name}')
+    if bucket and bucket not in TIME_BUCKETS:
+        raise ValueError(f'Unknown time bucket: {bucket}')
+
+    stats = _empty_counts()
+    stats['priority'] = {priority: 0 for priority in PRIORITIES}
+    stats['matrix'] = {status: {priority: 0 for priority in PRIORITIES} for status in STATUSES}
+    breakdowns = {name: {} for name in dimensions}
+    if bucket:
+        breakdowns['bucket'] = {}
+
+    rating_sum = 0
+    rating_count = 0
+    if department_id is NO_DEPARTMENT:
+        rows = []
+    elif dimensions or bucket:
+        rows = stats_query(department_id, dimensions, bucket)
+    else:
+        rows = counters_query(department_id)
+
+    for row in rows:
+        status, priority = row[0], row[1]
+        stats['total'] += row.ticket_count
+        stats[status] = stats.get(status, 0) + row.ticket_count
+        stats['priority'][priority] = stats['priority'].get(priority, 0) + row.ticket_count
+        stats['matrix'].setdefault(status, {})
+        stats['matrix'][status][priority] = stats['matrix'][status].get(priority, 0) + row.ticket_count
+        rating_sum += row.rating_sum or 0
+        rating_count += row.rating_count
+
+        for offset, name in enumerate(breakdowns):
+            key = row[2 + offset]
+            key = str(key) if key is not None else 'none'
+            counts = breakdowns[name].setdefault(key, _empty_counts())
+            counts['total'] += row.ticket_count
+            counts[status] = counts.get(status, 0) + row.ticket_count
+
+    stats['average_rating'] = round(rating_sum / rating_count, 2) if rating_count else None
+    for name, counts in breakdowns.items():
+        stats[f'by_{name}'] = counts
+    return stats
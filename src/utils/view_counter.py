@@ -0,0 +1,96 @@
+import atexit
+import logging
+import os
+import threading
+from sqlalchemy import case, update
+from src.models.user import db, FAQ
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_FLUSH_THRESHOLD = 100
+
+class ViewCounterBuffer:
+    """Collects FAQ view increments in memory and writes them in bulk
+
+    A flush is one UPDATE ... SET view_count = view_count + CASE id ...
+    for every buffered FAQ. The update is additive, so any number of
+    worker processes can flush their own buffers without losing views.
+    Flushes run on a background thread every `interval` seconds, as soon
+    as `threshold` views are pending, and at interpreter shutdown; a
+    request never writes the counts itself.
+    """
+
+    def __init__(self, interval=DEFAULT_FLUSH_INTERVAL, threshold=DEFAULT_FLUSH_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.app = None
+        self._lock = threading.Lock()
+        self._pending = {}  # faq id -> views not yet written
+        self._wake = threading.Event()
+        self._pid = None
+        self._flusher = None
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('FAQ_VIEW_FLUSH_INTERVAL', self.interval)
+        self.threshold = app.config.get('FAQ_VIEW_FLUSH_THRESHOLD', self.threshold)
+        atexit.register(self.flush)
+
+    def increment(self, faq_id):
+        """Record one view; returns the views pending for this FAQ, including this one"""
+        with self._lock:
+            self._check_process()
+            pending = self._pending.get(faq_id, 0) + 1
+            self._pending[faq_id] = pending
+            full = sum(self._pending.values()) >= self.threshold
+        if full:
+            self._wake.set()
+        return pending
+
+    def pending(self, faq_id):
+        with self._lock:
+            return self._pending.get(faq_id, 0)
+
+    def flush(self):
+        """Write all buffered views in one UPDATE; returns the views written"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(
+                        update(FAQ)
+                        .where(FAQ.id.in_(list(batch)))
+                        .values(view_count=FAQ.view_count + case(batch, value=FAQ.id, else_=0))
+                    )
+        except Exception:
+            # Keep the views for the next flush rather than dropping them
+            with self._lock:
+                for faq_id, count in batch.items():
+                    self._pending[faq_id] = self._pending.get(faq_id, 0) + count
+            raise
+        return sum(batch.values())
+
+    def _check_process(self):
+        """Start the flush thread; a forked worker drops its parent's buffer"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._pending = {}
+        self._flusher = threading.Thread(target=self._run, name='faq-view-flusher', daemon=True)
+        self._flusher.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('FAQ view count flush failed')
+
+view_counter = ViewCounterBuffer()
@@ -1,17 +1,281 @@
-import vonage
+import logging
 import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from requests.exceptions import ConnectionError, Timeout
+from sqlalchemy import case, event, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgres_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from src.models.user import db, WhatsAppMessage, IdCounter
 
-def send_whatsapp_message(to, body):
-    client = vonage.Client(
-        key=os.environ['VONAGE_API_KEY'],
-        secret=os.environ['VONAGE_API_SECRET']
-    )
-    messages = vonage.Messages(client)
-    response = messages.send_message({
-        "channel": "whatsapp",
-        "message_type": "text",
-        "to": to,
-        "from": os.environ['VONAGE_WHATSAPP_NUMBER'],
-        "text": body,
-    })
-    return response 
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+# Sends per second across every worker process sharing the database
+DEFAULT_RATE = 10
+# Minimum seconds between two messages to the same recipient
+DEFAULT_RECIPIENT_INTERVAL = 1.0
+DEFAULT_MAX_ATTEMPTS = 6
+# Retry backoff: RETRY_BASE ** attempts seconds, capped at RETRY_MAX
+RETRY_BASE = 2
+RETRY_MAX = 300
+LEASE_SECONDS = 60
+POLL_INTERVAL = 2.0
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """The process-wide Vonage client, so its HTTP connection pool is reused"""
+    # The SDK is imported on first use, keeping it out of worker startup
+    from vonage import Auth, HttpClientOptions, Vonage
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = Vonage(
+                Auth(api_key=os.environ['VONAGE_API_KEY'], api_secret=os.environ['VONAGE_API_SECRET']),
+                HttpClientOptions(
+                    api_host=os.environ.get('VONAGE_API_HOST', 'api.nexmo.com'),
+                    timeout=int(os.environ.get('VONAGE_TIMEOUT', 10)),
+                    pool_maxsize=int(os.environ.get('WHATSAPP_WORKERS', DEFAULT_WORKERS))
+                )
+            )
+            _client_pid = os.getpid()
+        return _client
+
+def send_whatsapp_message(to, body, client_ref=None):
+    """Send one WhatsApp text right away; returns Vonage's message_uuid"""
+    from vonage_messages import WhatsappText
+    response = get_client().messages.send(WhatsappText(
+        to=to,
+        from_=os.environ['VONAGE_WHATSAPP_NUMBER'],
+        text=body,
+        client_ref=client_ref
+    ))
+    return {'message_uuid': response.message_uuid}
+
+def retryable_errors():
+    """Failures worth retrying; anything else (bad number, auth) fails the message"""
+    from vonage_http_client.errors import RateLimitedError, ServerError
+    return (RateLimitedError, ServerError, ConnectionError, Timeout)
+
+class SharedRateLimiter:
+    """Allows `rate` calls per second in bursts of up to `burst`, across processes
+
+    The next free send time is kept in an IdCounter row (microseconds
+    since the epoch), so every worker of every process draws from one
+    budget. acquire() moves it forward by one slot in a single UPDATE
+    and sleeps until its slot; idle time builds up at most `burst` slots
+    of credit. Hosts must keep their clocks in sync.
+    """
+
+    def __init__(self, rate, burst=None, name='whatsapp_send_slot'):
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self.name = name
+
+    def acquire(self):
+        """Block until a call is allowed; needs an app context"""
+        step = int(1000000 / self.rate)
+        now = int(time.time() * 1000000)
+        floor = now - int((self.burst - 1) * step)
+        with db.engine.begin() as conn:
+            next_slot = self._reserve(conn, floor, step)
+        wait = (next_slot - step - now) / 1000000
+        if wait > 0:
+            time.sleep(wait)
+
+    def _reserve(self, conn, floor, step):
+        """Move the row past one slot starting no earlier than `floor`; returns its new value"""
+        advanced = case((IdCounter.next_value < floor, floor), else_=IdCounter.next_value) + step
+        dialect_insert = {'postgresql': postgres_insert, 'sqlite': sqlite_insert}.get(conn.dialect.name)
+        if dialect_insert is None:
+            updated = conn.execute(
+                update(IdCounter).where(IdCounter.name == self.name).values(next_value=advanced)
+            ).rowcount
+            if not updated:
+                conn.execute(IdCounter.__table__.insert().values(name=self.name, next_value=floor + step))
+            return conn.execute(select(IdCounter.next_value).where(IdCounter.name == self.name)).scalar()
+
+        stmt = dialect_insert(IdCounter).values(name=self.name, next_value=floor + step)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['name'],
+            set_={'next_value': advanced}
+        ).returning(IdCounter.next_value)
+        return conn.execute(stmt).scalar()
+
+class RecipientThrottle:
+    """Spaces out messages to the same recipient by at least `interval` seconds
+
+    Per process: messages to one recipient handled by different worker
+    processes are not spaced against each other.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = {}  # recipient -> monotonic time of the next allowed send
+        self._lock = threading.Lock()
+
+    def reserve(self, recipient):
+        """0 if a send to `recipient` may go now (and books it), else seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            ready = self._next.get(recipient, now)
+            if ready > now:
+                return ready - now
+            self._next[recipient] = now + self.interval
+            if len(self._next) > 10000:
+                self._next = {key: value for key, value in self._next.items() if value > now}
+            return 0
+
+    def sent(self, recipient):
+        """Count the interval from when the send finished, however long it took"""
+        with self._lock:
+            self._next[recipient] = max(self._next.get(recipient, 0), time.monotonic() + self.interval)
+
+class WhatsAppDelivery:
+    """Queued WhatsApp delivery by a pool of worker threads per process
+
+    enqueue() stores a WhatsAppMessage in the caller's transaction. Workers
+    claim due messages with a lease, respect the rate limit shared by all
+    processes and this process's per-recipient spacing, send through the shared Vonage client and record the
+    outcome on the row, which is what the status endpoint reports.
+    Throttling and server errors are retried with exponential backoff.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE,
+                 recipient_interval=DEFAULT_RECIPIENT_INTERVAL, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.limiter = SharedRateLimiter(rate)
+        self.recipients = RecipientThrottle(recipient_interval)
+        self.app = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('WHATSAPP_WORKERS', self.workers)
+        self.max_attempts = app.config.get('WHATSAPP_MAX_ATTEMPTS', self.max_attempts)
+        self.limiter = SharedRateLimiter(app.config.get('WHATSAPP_RATE', self.limiter.rate))
+        self.recipients = RecipientThrottle(app.config.get('WHATSAPP_RECIPIENT_INTERVAL', self.recipients.interval))
+        app.before_request(self.start)
+
+    def enqueue(self, to, body, key=None):
+        """Queue a message in the current transaction; a known `key` is not queued twice"""
+        if key is not None:
+            existing = WhatsAppMessage.query.filter_by(idempotency_key=key).first()
+            if existing is not None:
+                return existing
+        message = WhatsAppMessage(idempotency_key=key or uuid.uuid4().hex, to=to, body=body)
+        db.session.add(message)
+        db.session.info['whatsapp_queued'] = True
+        return message
+
+    def start(self):
+        """Start this process's workers; a forked worker starts its own"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for number in range(self.workers):
+                threading.Thread(target=self._run, name=f'whatsapp-delivery-{number}', daemon=True).start()
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+            try:
+                while self.deliver_next():
+                    pass
+            except Exception:
+                logger.exception('WhatsApp delivery failed')
+
+    def deliver_next(self):
+        """Claim and handle one due message; False when none is due"""
+        with self.app.app_context():
+            message = self._claim()
+            if message is None:
+                return False
+            self._deliver(message)
+            return True
+
+    def _claim(self):
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        claimable = or_(WhatsAppMessage.locked_until.is_(None), WhatsAppMessage.locked_until < now)
+        due = (
+            select(WhatsAppMessage.id)
+            .where(WhatsAppMessage.status == 'queued', WhatsAppMessage.next_attempt_at <= now, claimable)
+            .order_by(WhatsAppMessage.id)
+            .limit(1)
+        )
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(WhatsAppMessage)
+                .where(WhatsAppMessage.id.in_(due), WhatsAppMessage.status == 'queued', claimable)
+                .values(locked_by=token, locked_until=now + timedelta(seconds=LEASE_SECONDS))
+                .execution_options(synchronize_session=False)
+            )
+            return conn.execute(
+                select(WhatsAppMessage.__table__).where(WhatsAppMessage.locked_by == token)
+            ).first()
+
+    def _deliver(self, message):
+        values = {'locked_by': None, 'locked_until': None}
+        wait = self.recipients.reserve(message.to)
+        if wait:
+            # Not an attempt: just try again once the recipient may receive
+            values['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=wait)
+            self._save(message.id, values)
+            self._wake_after(wait)
+            return
+
+        self.limiter.acquire()
+        values['attempts'] = message.attempts + 1
+        try:
+            result = send_whatsapp_message(message.to, message.body, client_ref=message.idempotency_key)
+        except Exception as e:
+            self.recipients.sent(message.to)
+            values['last_error'] = str(e)
+            if isinstance(e, retryable_errors()) and values['attempts'] < self.max_attempts:
+                delay = min(RETRY_BASE ** values['attempts'], RETRY_MAX)
+                values['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=delay)
+                self._wake_after(delay)
+            else:
+                values['status'] = 'failed'
+        else:
+            self.recipients.sent(message.to)
+            values['status'] = 'sent'
+            values['sent_at'] = datetime.utcnow()
+            values['provider_message_id'] = result['message_uuid']
+        self._save(message.id, values)
+
+    def _wake_after(self, seconds):
+        timer = threading.Timer(seconds, self._wake.set)
+        timer.daemon = True
+        timer.start()
+
+    def _save(self, message_id, values):
+        with db.engine.begin() as conn:
+            conn.execute(update(WhatsAppMessage).where(WhatsAppMessage.id == message_id).values(**values))
+
+whatsapp_delivery = WhatsAppDelivery()
+
+@event.listens_for(Session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop('whatsapp_queued', None):
+        whatsapp_delivery.wake()
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_queued(session):
+    session.info.pop('whatsapp_queued', None)